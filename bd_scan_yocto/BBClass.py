@@ -4,25 +4,68 @@ import sys
 import re
 import os
 from .RecipeClass import Recipe
+from .DependGraphClass import DependGraph
+from .CacheClass import Cache
+from .FileIndexClass import FileIndex
 import tempfile
 import glob
 import tarfile
+import mmap
+import threading
+import signal
+from contextlib import closing
+from concurrent.futures import ProcessPoolExecutor
 
 # from .ConfigClass import Config
 # from .RecipeListClass import RecipeList
 
+# Variables extracted from 'bitbake -e' output, dispatched by name after a single anchored match per line
+# VARIABLE: (Config attribute to set or '' to only record value, overwrite existing Config value, log label)
+# Use BB.register_env_var() to extract additional variables
+bitbake_env_vars = {
+    'MANIFEST_FILE': ('license_manifest', False, 'manifestfile'),
+    'DEPLOY_DIR': ('deploy_dir', False, 'deploydir'),
+    'MACHINE_ARCH': ('machine', False, 'machine'),
+    'DL_DIR': ('download_dir', False, 'download_dir'),
+    'LICENSE_DIR': ('license_dir', False, 'license_dir'),
+    'DEPLOY_DIR_RPM': ('', False, 'rpm_dir'),
+    'DEPLOY_DIR_IPK': ('', False, 'ipk_dir'),
+    'DEPLOY_DIR_DEB': ('', False, 'deb_dir'),
+    'IMAGE_PKGTYPE': ('image_package_type', True, 'image_package_type'),
+    'LOG_DIR': ('log_dir', True, 'log_dir'),
+    'DISTRO_CODENAME': ('distro_codename', False, 'distro_codename'),
+    'LAYERSERIES_CORENAMES': ('layerseries_corenames', False, 'layerseries_corenames'),
+    'PKGDATA_DIR': ('pkgdata_dir', False, 'pkgdata_dir'),
+    'BUILDHISTORY_DIR': ('buildhistory_dir', False, 'buildhistory_dir'),
+}
+# Variables every build defines - output is read until all of these have been found and (as 'bitbake -e' lists
+# variables sorted by name) a variable sorting after every registered variable is reached, so optional variables
+# are still recorded
+bitbake_env_required = {'MANIFEST_FILE', 'DEPLOY_DIR', 'MACHINE_ARCH', 'DL_DIR', 'LICENSE_DIR', 'DEPLOY_DIR_RPM',
+                        'DEPLOY_DIR_IPK', 'DEPLOY_DIR_DEB', 'IMAGE_PKGTYPE', 'LOG_DIR'}
+bitbake_env_line_pattern = re.compile(r'([A-Za-z0-9_]+)=(.*)')
+
+# "<recipe>.<task>" [label="<recipe> <task>\n:<ver>-r<0>\nvirtual:native:<bbpath>"]
+# "<recipe>.<task>" -> "<subrecipe>.<subtask>"
+# Pattern includes the preceding newline as a literal prefix (much faster than a MULTILINE '^' anchor)
+task_depends_pattern = re.compile(
+    rb'\n"([^".\n]*)[^"\n]*" (?:(\[label=)"[^"\\\n]*\\n([^"\\\n]*)|-> "([^".\n]*))')
+# Size of the line-aligned byte chunks handed to the pattern matcher
+task_depends_chunk_size = 8 * 1024 * 1024
+# Files larger than this are split on line boundaries and parsed across a process pool
+task_depends_parallel_size = 32 * 1024 * 1024
+
 
 class BB:
     def __init__(self):
-        pass
+        self.env_fingerprint = ''
 
     def process(self, conf: "Config", reclist: "RecipeList"):
-        layers_file = ''
+        layer_entries = None
         if not conf.skip_bitbake:
-            self.process_bitbake_env(conf)
-            layers_file = self.run_showlayers()
+            layer_entries = self.run_bitbake_commands(conf)
         elif conf.bitbake_layers_file:
-            layers_file = conf.bitbake_layers_file
+            layer_entries = self.load_showlayers_file(conf.bitbake_layers_file)
         elif not conf.skip_layers:
             logging.error(f"Error --skip_bitbake and no bitbake_layers_file specified - terminating")
             return False
@@ -39,7 +82,7 @@ class BB:
         if conf.task_depends_dot_file:
             self.process_task_depends_dot(conf, reclist)
 
-        if not self.process_showlayers(conf, layers_file, reclist):
+        if not self.process_showlayers(conf, layer_entries, reclist):
             return False
         return True
 
@@ -61,76 +104,222 @@ class BB:
 
         return True
 
-    def run_bitbake_env(self):
+    def run_bitbake_commands(self, conf: "Config"):
+        # Runs 'bitbake -e' then 'bitbake-layers show-recipes' (one at a time - the bitbake server only serves one
+        # client at a time, so running them concurrently does not reduce the elapsed time)
+        # Returns the show-recipes layer entries
+        if not self.process_bitbake_env(conf):
+            # Calculate default folders without bitbake env
+            self.apply_bitbake_env(conf, {})
+        return self.run_showlayers(conf)
+
+    def run_bitbake_env(self, conf: "Config"):
+        # Output is parsed as it is streamed - bitbake is stopped once all required variables have been seen
         cmd = ["bitbake", "-e"]
-        ret, out = self.run_cmd(cmd)
-        if not ret:
-            logging.error("Cannot run 'bitbake -e'")
-            return ''
-        return out
+        try:
+            with closing(self.run_cmd_lines(cmd, timeout=conf.bitbake_timeout)) as lines:
+                return self.get_bitbake_env_vars(lines)
+        except Exception as e:
+            logging.error(f"Cannot run 'bitbake -e' - {e}")
+        return {}
+
+    def run_showlayers(self, conf: "Config"):
+        # Returns list of [recipe, layer, version] entries (None if command failed)
+        cfile = self.get_cache_file(conf, 'bitbake_layers', 'json')
+        layer_entries = None if conf.cache_refresh else Cache.load_json(cfile)
+        if layer_entries is not None:
+            logging.info(f"Using cached 'bitbake-layers show-recipes' output {cfile}")
+            return layer_entries
 
-    def run_showlayers(self):
         cmd = ["bitbake-layers", "show-recipes"]
-        ret, out = self.run_cmd(cmd)
-        if not ret:
-            logging.error("Cannot run 'bitbake-layers show-recipes'")
-            return ''
-        lfile = tempfile.NamedTemporaryFile(mode="w", delete=False)
-        lfile.write(out)
-        lfile.close()
+        try:
+            with closing(self.run_cmd_lines(cmd, timeout=conf.bitbake_timeout)) as lines:
+                layer_entries = [list(entry) for entry in self.read_showlayers(lines)]
+        except Exception as e:
+            logging.error(f"Cannot run 'bitbake-layers show-recipes' - {e}")
+            return None
+
+        if cfile:
+            Cache.save_json(cfile, layer_entries)
+        return layer_entries
 
-        return lfile.name
+    @staticmethod
+    def load_showlayers_file(showlayers_file):
+        try:
+            with open(showlayers_file, "r") as bfile:
+                return [list(entry) for entry in BB.read_showlayers(bfile)]
+        except Exception as e:
+            logging.error(f"Cannot process bitbake-layers output file '{showlayers_file} - error {e}")
+        return None
+
+    @staticmethod
+    def get_build_dir(conf: "Config"):
+        if conf.build_dir:
+            return conf.build_dir
+        return os.environ.get('BUILDDIR', os.getcwd())
+
+    @staticmethod
+    def get_layer_paths(build_dir):
+        # Extract existing absolute layer folders from BBLAYERS in bblayers.conf
+        paths = []
+        try:
+            with open(os.path.join(build_dir, 'conf', 'bblayers.conf'), "r") as bfile:
+                text = bfile.read()
+            for token in re.findall(r'[^\s"\'\\]+', text):
+                token = token.replace('${TOPDIR}', build_dir)
+                if os.path.isabs(token) and os.path.isdir(token) and token not in paths:
+                    paths.append(os.path.normpath(token))
+        except OSError as e:
+            logging.debug(f"Unable to read bblayers.conf - {e}")
+        return paths
+
+    @staticmethod
+    def get_git_revision(path):
+        # Read HEAD revision of the git repo containing path without running git
+        path = os.path.abspath(path)
+        while not os.path.exists(os.path.join(path, '.git')):
+            parent = os.path.dirname(path)
+            if parent == path:
+                return ''
+            path = parent
+        gitdir = os.path.join(path, '.git')
+        try:
+            if os.path.isfile(gitdir):
+                # Submodule or worktree - .git file contains 'gitdir: <path>'
+                with open(gitdir, "r") as gfile:
+                    gitdir = os.path.join(path, gfile.read().strip().split('gitdir: ')[-1])
+            with open(os.path.join(gitdir, 'HEAD'), "r") as hfile:
+                head = hfile.read().strip()
+            if not head.startswith('ref: '):
+                return head
+            ref = head[5:]
+            reffile = os.path.join(gitdir, ref)
+            if os.path.isfile(reffile):
+                with open(reffile, "r") as rfile:
+                    return rfile.read().strip()
+            packed = os.path.join(gitdir, 'packed-refs')
+            if os.path.isfile(packed):
+                with open(packed, "r") as pfile:
+                    for line in pfile:
+                        if line.rstrip().endswith(' ' + ref):
+                            return line.split(' ')[0]
+            return head
+        except OSError as e:
+            logging.debug(f"Unable to read git revision for {path} - {e}")
+        return ''
+
+    @staticmethod
+    def get_layer_state(path):
+        # Number of files and newest modification time below layer folder - covers uncommitted edits, new or removed
+        # recipe/bbappend files and layers which are not git checkouts
+        count = 0
+        newest = 0
+        stack = [path]
+        while stack:
+            folder = stack.pop()
+            try:
+                with os.scandir(folder) as it:
+                    for entry in it:
+                        if entry.name == '.git':
+                            continue
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        count += 1
+                        newest = max(newest, entry.stat(follow_symlinks=False).st_mtime_ns)
+            except OSError as e:
+                logging.debug(f"Unable to scan layer folder {folder} - {e}")
+        return f"{count}:{newest}"
+
+    def get_env_fingerprint(self, conf: "Config"):
+        # Fingerprint of build configuration - local.conf, bblayers.conf, layer revisions, layer working tree state
+        # and target
+        if self.env_fingerprint:
+            return self.env_fingerprint
+        build_dir = self.get_build_dir(conf)
+        values = [os.path.abspath(build_dir), conf.target]
+        for cname in ['local.conf', 'bblayers.conf', 'site.conf', 'auto.conf']:
+            values.append(Cache.file_fingerprint(os.path.join(build_dir, 'conf', cname)))
+        for layer in self.get_layer_paths(build_dir):
+            values += [layer, self.get_git_revision(layer), self.get_layer_state(layer)]
+        for var in ['MACHINE', 'DISTRO', 'SDKMACHINE']:
+            values.append(os.environ.get(var, ''))
+        # Cached env is invalid if the set of extracted variables changes
+        values += sorted(bitbake_env_vars.keys())
+        self.env_fingerprint = Cache.fingerprint(values)
+        logging.debug(f"Bitbake environment fingerprint {self.env_fingerprint}")
+        return self.env_fingerprint
+
+    def get_cache_file(self, conf: "Config", name, ext):
+        if not conf.cache_dir:
+            return ''
+        return Cache.get_path(conf, f"{name}_{self.get_env_fingerprint(conf)[:16]}.{ext}")
 
     def process_bitbake_env(self, conf: "Config"):
-        lines = self.run_bitbake_env().split('\n')
+        cfile = self.get_cache_file(conf, 'bitbake_env', 'json')
+        # Cached values are only used if extracted for the same set of variables
+        variables = sorted(bitbake_env_vars)
+        data = None if conf.cache_refresh else Cache.load_json(cfile)
+        env_vars = None
+        if isinstance(data, dict) and data.get('variables') == variables:
+            env_vars = data.get('env')
+        if env_vars is not None:
+            logging.info(f"Using cached 'bitbake -e' environment {cfile} (build configuration unchanged)")
+        else:
+            env_vars = self.run_bitbake_env(conf)
+            if not env_vars:
+                return False
+            if cfile:
+                Cache.save_json(cfile, {'variables': variables, 'env': env_vars})
 
-        rpm_dir = ''
-        ipk_dir = ''
-        deb_dir = ''
-        for mline in lines:
-            if re.search(
-                    "^(MANIFEST_FILE|DEPLOY_DIR|MACHINE_ARCH|DL_DIR|DEPLOY_DIR_RPM|"
-                    "DEPLOY_DIR_IPK|DEPLOY_DIR_DEB|IMAGE_PKGTYPE|LICENSE_DIR|LOG_DIR)=",
-                    mline):
+        self.apply_bitbake_env(conf, env_vars)
+        return True
 
+    @staticmethod
+    def register_env_var(var, attr='', overwrite=False, label='', required=False):
+        # Add variable to extract from 'bitbake -e' output (and Config attribute to set)
+        bitbake_env_vars[var] = (attr, overwrite, label if label else var.lower())
+        if required:
+            bitbake_env_required.add(var)
+
+    @staticmethod
+    def get_bitbake_env_vars(lines):
+        # Stops reading lines once all variables have been found, or once all required variables have been found
+        # and the (sorted) output has passed the last registered variable name
+        env_vars = {}
+        required = 0
+        last_var = max(bitbake_env_vars)
+        for mline in lines:
+            match = bitbake_env_line_pattern.match(mline)
+            if match is None:
+                continue
+            var = match.group(1)
+            if var in bitbake_env_vars and var not in env_vars:
                 # if re.search('^TMPDIR=', mline):
                 #     tmpdir = mline.split('=')[1]
-                val = mline.split('=')[1].strip('\"')
-                if re.search('^MANIFEST_FILE=', mline):
-                    if not conf.license_manifest:
-                        conf.license_manifest = val
-                        logging.info(f"Bitbake Env: manifestfile={conf.license_manifest}")
-                elif re.search('^DEPLOY_DIR=', mline):
-                    if not conf.deploy_dir:
-                        conf.deploy_dir = val
-                        logging.info(f"Bitbake Env: deploydir={conf.deploy_dir}")
-                elif re.search('^MACHINE_ARCH=', mline):
-                    if not conf.machine:
-                        conf.machine = val
-                        logging.info(f"Bitbake Env: machine={conf.machine}")
-                elif re.search('^DL_DIR=', mline):
-                    if not conf.download_dir:
-                        conf.download_dir = val
-                        logging.info(f"Bitbake Env: download_dir={conf.download_dir}")
-                elif re.search('^LICENSE_DIR=', mline):
-                    if not conf.license_dir:
-                        conf.license_dir = val
-                        logging.info(f"Bitbake Env: license_dir={conf.license_dir}")
-                elif not rpm_dir and re.search('^DEPLOY_DIR_RPM=', mline):
-                    rpm_dir = val
-                    logging.info(f"Bitbake Env: rpm_dir={rpm_dir}")
-                elif not ipk_dir and re.search('^DEPLOY_DIR_IPK=', mline):
-                    ipk_dir = val
-                    logging.info(f"Bitbake Env: ipk_dir={ipk_dir}")
-                elif not deb_dir and re.search('^DEPLOY_DIR_DEB=', mline):
-                    deb_dir = val
-                    logging.info(f"Bitbake Env: deb_dir={deb_dir}")
-                elif re.search('^IMAGE_PKGTYPE=', mline):
-                    conf.image_package_type = val
-                    logging.info(f"Bitbake Env: image_package_type={conf.image_package_type}")
-                elif re.search('^LOG_DIR=', mline):
-                    conf.log_dir = val
-                    logging.info(f"Bitbake Env: log_dir={conf.log_dir}")
+                env_vars[var] = match.group(2).rstrip('\n').split('=')[0].strip('\"')
+                if var in bitbake_env_required:
+                    required += 1
+                if len(env_vars) == len(bitbake_env_vars):
+                    break
+            elif var > last_var and required == len(bitbake_env_required):
+                break
+        return env_vars
+
+    @staticmethod
+    def apply_bitbake_env(conf: "Config", env_vars):
+        for var, (attr, overwrite, label) in bitbake_env_vars.items():
+            if var not in env_vars:
+                continue
+            val = env_vars[var]
+            if not attr:
+                if val:
+                    logging.info(f"Bitbake Env: {label}={val}")
+            elif overwrite or not getattr(conf, attr):
+                setattr(conf, attr, val)
+                logging.info(f"Bitbake Env: {label}={val}")
+        rpm_dir = env_vars.get('DEPLOY_DIR_RPM', '')
+        ipk_dir = env_vars.get('DEPLOY_DIR_IPK', '')
+        deb_dir = env_vars.get('DEPLOY_DIR_DEB', '')
 
         if not conf.package_dir:
             if conf.image_package_type == 'rpm' and rpm_dir:
@@ -160,9 +349,52 @@ class BB:
                 logging.info(f"Calculated: package_dir={conf.package_dir}")
 
     @staticmethod
-    def run_cmd(command: list):
+    def run_cmd_lines(command: list, timeout=120):
+        # Generator - yields stdout lines as the command produces them
+        # Raises exception if command fails or exceeds timeout - process is killed if the generator is closed early
+        timed_out = threading.Event()
+        with tempfile.TemporaryFile(mode="w+") as errfile:
+            # Own process group so that child processes holding stdout open are also killed
+            proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=errfile, text=True,
+                                    start_new_session=(os.name == 'posix'))
+
+            def kill_proc():
+                try:
+                    if os.name == 'posix':
+                        os.killpg(proc.pid, signal.SIGKILL)
+                    else:
+                        proc.kill()
+                except OSError:
+                    pass
+
+            def kill_on_timeout():
+                timed_out.set()
+                kill_proc()
+
+            timer = threading.Timer(timeout, kill_on_timeout)
+            timer.start()
+            completed = False
+            try:
+                for line in proc.stdout:
+                    yield line
+                completed = True
+            finally:
+                timer.cancel()
+                if not completed:
+                    kill_proc()
+                proc.stdout.close()
+                retval = proc.wait()
+
+            if timed_out.is_set():
+                raise subprocess.TimeoutExpired(command, timeout)
+            if retval != 0:
+                errfile.seek(0)
+                raise Exception(f"Command '{command}' failed with error {retval} - {errfile.read()}")
+
+    @staticmethod
+    def run_cmd(command: list, timeout=120):
         try:
-            ret = subprocess.run(command, capture_output=True, text=True, timeout=120)
+            ret = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
             if ret.returncode != 0:
                 logging.error(f"Run command '{command}' failed with error {ret.returncode} - {ret.stderr}")
                 return False, ''
@@ -177,105 +409,123 @@ class BB:
         # return proc_stdout
 
     @staticmethod
-    def process_showlayers(conf: "Config", showlayers_file: str, reclist: "RecipeList"):
+    def read_showlayers(lines):
+        # Generator - yields (recipe, layer, version) from 'bitbake-layers show-recipes' output lines
+        rec = ""
+        bstart = False
+        for rline in lines:
+            rline = rline.strip()
+            if bstart:
+                if rline.endswith(":"):
+                    arr = rline.split(":")
+                    rec = arr[0]
+                elif rec:
+                    arr = rline.split()
+                    if len(arr) > 1:
+                        yield rec, arr[0], arr[1]
+                    rec = ""
+            elif rline.endswith(": ==="):
+                bstart = True
+
+    @staticmethod
+    def process_showlayers(conf: "Config", layer_entries, reclist: "RecipeList"):
         if conf.skip_layers:
             return True
-        try:
-            with open(showlayers_file, "r") as bfile:
-                lines = bfile.readlines()
-            rec = ""
-            bstart = False
-            for rline in lines:
-                rline = rline.strip()
-                if bstart:
-                    if rline.endswith(":"):
-                        arr = rline.split(":")
-                        rec = arr[0]
-                    elif rec:
-                        arr = rline.split()
-                        if len(arr) > 1:
-                            layer = arr[0]
-                            ver = arr[1]
-                            if layer in conf.exclude_layers:
-                                reclist.remove_recipe(rec)
-                                logging.info(f"Excluding recipe {layer}/{rec} due to --exclude_layers list")
-                            else:
-                                reclist.add_layer_to_recipe(rec, layer, ver)
-                        rec = ""
-                elif rline.endswith(": ==="):
-                    bstart = True
-
-            logging.info(f"- {reclist.count_recipes_without_layer()} recipes without layer reported from layer file")
-        except Exception as e:
-            logging.error(f"Cannot process bitbake-layers output file '{showlayers_file} - error {e}")
+        if layer_entries is None:
+            logging.error(f"Unable to get recipe layers from bitbake-layers output")
             return False
 
+        for rec, layer, ver in layer_entries:
+            if layer in conf.exclude_layers:
+                reclist.remove_recipe(rec)
+                logging.info(f"Excluding recipe {layer}/{rec} due to --exclude_layers list")
+            else:
+                reclist.add_layer_to_recipe(rec, layer, ver)
+
+        logging.info(f"- {reclist.count_recipes_without_layer()} recipes without layer reported from layer file")
         return True
 
+    @staticmethod
+    def read_licman_records(lic_manifest_file):
+        # Generator - yields one (recipe_name, version, license, files) tuple per package record
+        # PACKAGE NAME: name
+        # PACKAGE VERSION: ver
+        # RECIPE NAME: rname
+        # LICENSE: License
+        # FILES: files (image_license.manifest only - follows the record it belongs to)
+        #
+        ver = ''
+        recipe_name = ''
+        licstring = ''
+        pending = None
+        with open(lic_manifest_file, "r") as lfile:
+            for line in lfile:
+                line = line.strip()
+                if not line:
+                    continue
+                field, sep, value = line.partition(': ')
+                if field == "FILES":
+                    if pending is not None:
+                        pending = (pending[0], pending[1], pending[2], value)
+                    continue
+                if field not in ("PACKAGE VERSION", "VERSION", "RECIPE NAME", "LICENSE"):
+                    continue
+                if pending is not None:
+                    yield pending
+                    pending = None
+                if field == "RECIPE NAME":
+                    recipe_name = value
+                elif field == "LICENSE":
+                    licstring = value
+                else:
+                    ver = value
+
+                if recipe_name and ver and licstring:
+                    pending = (recipe_name, ver, licstring, '')
+                    ver = ''
+                    recipe_name = ''
+                    licstring = ''
+
+        if pending is not None:
+            yield pending
+
     @staticmethod
     def process_licman_file(conf: "Config", lic_manifest_file, reclist: "RecipeList"):
         packages_total = 0
         recipes_total = 0
+        lic_filters = [lic_filter.lower() for lic_filter in conf.filter_recipes_by_licenses]
         try:
-            with open(lic_manifest_file, "r") as lfile:
-                lines = lfile.readlines()
-                ver = ''
-                recipe_name = ''
-                prev_recipe = ''
-                licstring = ''
-                for line in lines:
-                    # PACKAGE NAME: name
-                    # PACKAGE VERSION: ver
-                    # RECIPE NAME: rname
-                    # LICENSE: License
-                    #
-                    line = line.strip()
-                    if line.startswith("PACKAGE VERSION:"):
-                        ver = line.split(': ')[1]
-                    elif line.startswith("VERSION:"):
-                        ver = line.split(': ')[1]
-                    elif line.startswith("RECIPE NAME:"):
-                        recipe_name = line.split(': ')[1]
-                    elif line.startswith("LICENSE:"):
-                        licstring = line.split(': ')[1]
-                    elif line.startswith("FILES:"):
-                        if prev_recipe == conf.kernel_recipe:
-                            kfiles = line.split(': ')[1]
-                            conf.kernel_files = kfiles.split(' ')
-
-                    if recipe_name and ver and licstring:
-                        packages_total += 1
-                        # expression = re.sub(r'\b([\w.-]+)\b\s*&\s*\b([\w.-]+)\b', r'(\1 AND \2)', licstring)
-                        expression = licstring.replace(' & ', ' AND ')
-                        # expression = re.sub(r'\b([\w.-]+)\b\s*\|\s*\b([\w.-]+)\b', r'(\1 OR \2)', expression)
-                        expression = expression.replace(' | ', ' OR ')
-
-                        rec_obj = Recipe(recipe_name, ver, licstring=expression)
-                        # rec_obj.custom_component = True
-                        # else:
-                        #     rec_obj = Recipe(recipe_name, ver)
-
-                        license_filtered = False
-                        if conf.filter_recipes_by_licenses:
-                            for lic_filter in conf.filter_recipes_by_licenses:
-                                if lic_filter.lower() in licstring.lower():
-                                    logging.info(f"Filtering recipe {recipe_name} (license '{licstring}' "
-                                                 f"matched filter '{lic_filter}')")
-                                    license_filtered = True
-                                    break
-                        if license_filtered:
-                            pass
-                        elif recipe_name in conf.exclude_recipes:
-                            logging.info(f"Excluding recipe {recipe_name} due to --exclude_recipes list")
-                        elif not reclist.check_recipe_exists(recipe_name):
-                            reclist.recipes.append(rec_obj)
-                            recipes_total += 1
-                        ver = ''
-                        prev_recipe = recipe_name
-                        recipe_name = ''
-                        licstring = ''
-
-                logging.info(f"- {packages_total} packages found in {lic_manifest_file} ({recipes_total} recipes)")
+            for recipe_name, ver, licstring, files in BB.read_licman_records(lic_manifest_file):
+                packages_total += 1
+                if files and recipe_name == conf.kernel_recipe:
+                    conf.kernel_files = files.split(' ')
+
+                license_filtered = False
+                if lic_filters:
+                    licstring_lower = licstring.lower()
+                    for index, lic_filter in enumerate(lic_filters):
+                        if lic_filter in licstring_lower:
+                            logging.info(f"Filtering recipe {recipe_name} (license '{licstring}' "
+                                         f"matched filter '{conf.filter_recipes_by_licenses[index]}')")
+                            license_filtered = True
+                            break
+                if license_filtered:
+                    continue
+                elif recipe_name in conf.exclude_recipes:
+                    logging.info(f"Excluding recipe {recipe_name} due to --exclude_recipes list")
+                    continue
+                elif reclist.check_recipe_exists(recipe_name):
+                    continue
+
+                # expression = re.sub(r'\b([\w.-]+)\b\s*&\s*\b([\w.-]+)\b', r'(\1 AND \2)', licstring)
+                expression = licstring.replace(' & ', ' AND ')
+                # expression = re.sub(r'\b([\w.-]+)\b\s*\|\s*\b([\w.-]+)\b', r'(\1 OR \2)', expression)
+                expression = expression.replace(' | ', ' OR ')
+
+                if reclist.add_recipe(Recipe(recipe_name, ver, licstring=expression)):
+                    recipes_total += 1
+
+            logging.info(f"- {packages_total} packages found in {lic_manifest_file} ({recipes_total} recipes)")
 
         except Exception as e:
             logging.error(f"Cannot read license manifest file '{lic_manifest_file}' - error '{e}'")
@@ -310,10 +560,10 @@ class BB:
                 manpath = os.path.join(conf.deploy_dir, "licenses", "**", "license.manifest")
                 logging.debug(f"License.manifest glob path is {manpath}")
                 manifest = ""
-                manlist = sorted(glob.glob(manpath, recursive=True), key=os.path.getmtime)
-                if len(manlist) > 0:
+                licdir = os.path.join(conf.deploy_dir, "licenses")
+                if os.path.isdir(licdir):
                     # Get most recent file
-                    manifest = manlist[-1]
+                    manifest = FileIndex.find_latest_file(conf, licdir, "license.manifest")
 
                 if not os.path.isfile(manifest):
                     logging.error(f"Manifest file 'license.manifest' could not be located (Search path is '{manpath})")
@@ -352,11 +602,10 @@ class BB:
                 #             cvefile = os.path.join(imgdir, file)
                 #             break
 
-                cvepath = os.path.join(conf.deploy_dir, "images", "**", conf.target + "-" + machine + "*.cve")
-                cvelist = sorted(glob.glob(cvepath, recursive=True), key=os.path.getmtime)
-                if len(cvelist) > 0:
+                imgdir = os.path.join(conf.deploy_dir, "images")
+                if os.path.isdir(imgdir):
                     # Get most recent file
-                    cfile = cvelist[-1]
+                    cfile = FileIndex.find_latest_file(conf, imgdir, conf.target + "-" + machine + "*.cve")
                     if os.path.isfile(cfile):
                         cvefile = cfile
 
@@ -374,11 +623,9 @@ class BB:
             logging.warning(f"Package_dir {conf.package_dir} does not exist")
             return []
         logging.info(f"Package_dir={conf.package_dir} Image_package_type={conf.image_package_type}")
-        pattern = f"{conf.package_dir}/**/*.{conf.image_package_type}"
-        package_paths_list = glob.glob(pattern, recursive=True)
         package_files_list = []
         count = 0
-        for path in package_paths_list:
+        for path in FileIndex.find_files(conf, conf.package_dir, f"*.{conf.image_package_type}"):
             count += 1
             package_files_list.append(path)
         logging.debug(f"Found {count} files")
@@ -391,12 +638,9 @@ class BB:
             return []
         logging.info(f"Download_dir={conf.download_dir}")
 
-        pattern = f"{conf.download_dir}/*"
-        # print(pattern)
-        all_download_paths_list = glob.glob(pattern, recursive=True)
         download_files_list = []
         count = 0
-        for path in all_download_paths_list:
+        for path in FileIndex.find_files(conf, conf.download_dir, "*", recursive=False):
             if not path.endswith(".done"):
                 count += 1
                 download_files_list.append(path)
@@ -404,69 +648,106 @@ class BB:
 
         return download_files_list
 
+    @staticmethod
+    def parse_task_depends_range(task_depends_file, start, end):
+        # Returns first version string seen for each recipe and ordered (deduplicated) child recipes
+        nodes = {}
+        edges = {}
+        with open(task_depends_file, "rb") as tdfile:
+            with mmap.mmap(tdfile.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                pos = start
+                while pos < end:
+                    chunk_end = mm.find(b'\n', min(pos + task_depends_chunk_size, end) - 1, end) + 1
+                    if chunk_end <= pos:
+                        chunk_end = end
+                    if pos == 0:
+                        matches = task_depends_pattern.findall(b'\n' + mm[0:chunk_end])
+                    else:
+                        # Start on the newline which ends the previous chunk
+                        matches = task_depends_pattern.findall(mm, pos - 1, chunk_end)
+                    for recipe, label, verstring, subrec in matches:
+                        if label:
+                            if recipe not in nodes:
+                                nodes[recipe] = verstring
+                        elif subrec != recipe:
+                            children = edges.get(recipe)
+                            if children is None:
+                                children = edges[recipe] = {}
+                            children[subrec] = None
+                    pos = chunk_end
+        return nodes, edges
+
+    @staticmethod
+    def get_task_depends_ranges(task_depends_file, size):
+        workers = os.cpu_count() or 1
+        if size < task_depends_parallel_size or workers < 2:
+            return [(0, size)]
+
+        ranges = []
+        with open(task_depends_file, "rb") as tdfile:
+            with mmap.mmap(tdfile.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                start = 0
+                for index in range(1, workers):
+                    end = mm.find(b'\n', max(start, size * index // workers)) + 1
+                    if end <= start:
+                        break
+                    ranges.append((start, end))
+                    start = end
+                ranges.append((start, size))
+        return ranges
+
+    @staticmethod
+    def read_task_depends_dot(task_depends_file):
+        size = os.path.getsize(task_depends_file)
+        if size == 0:
+            return {}
+
+        ranges = BB.get_task_depends_ranges(task_depends_file, size)
+        if len(ranges) == 1:
+            results = [BB.parse_task_depends_range(task_depends_file, 0, size)]
+        else:
+            logging.debug(f"Parsing '{task_depends_file}' in {len(ranges)} parallel chunks")
+            with ProcessPoolExecutor(max_workers=len(ranges)) as executor:
+                results = list(executor.map(BB.parse_task_depends_range, [task_depends_file] * len(ranges),
+                                            [r[0] for r in ranges], [r[1] for r in ranges]))
+
+        # Merge chunk results in file order so the first occurrence of each recipe wins
+        recipe_dict = {}
+        children_dict = {}
+        for nodes, edges in results:
+            for recipe, verstring in nodes.items():
+                if recipe not in recipe_dict:
+                    verarr = verstring.decode('utf-8').split('-')
+                    recipe_dict[recipe] = {
+                        'ver': verarr[0][1:],
+                        'rel': verarr[1] if len(verarr) > 1 else '',
+                        'children': [],
+                        'processed': False
+                    }
+            for recipe, children in edges.items():
+                if recipe in children_dict:
+                    children_dict[recipe].update(children)
+                else:
+                    children_dict[recipe] = children
+
+        ret_dict = {}
+        for recipe, entry in recipe_dict.items():
+            if recipe in children_dict:
+                entry['children'] = [child.decode('utf-8') for child in children_dict[recipe]]
+            ret_dict[recipe.decode('utf-8')] = entry
+        return ret_dict
+
     @staticmethod
     def process_task_depends_dot(conf: "Config", reclist: "RecipeList"):
         # If reclist is non-zero, check the recipes from task-depends.dot file against this list
         # otherwise create new reclist from task-depends.dot
 
-        recipe_dict = {}
-
         if not os.path.exists(conf.task_depends_dot_file):
             logging.error(f"Cannot locate task depends '{conf.task_depends_dot_file}'")
             sys.exit(2)
 
         try:
-            with open(conf.task_depends_dot_file, "r") as tdfile:
-                lines = tdfile.readlines()
-                for line in lines:
-                    # "<recipe>.<task>" [label="<recipe> <task>\n:<ver>-r<0>\nvirtual:native:<bbpath>"]
-                    # "<recipe>.<task>" -> "<subrecipe>.<subtask>"
-                    #
-                    line = line.strip()
-                    if line.startswith("\""):
-                        if line.endswith("]"):
-                            # "<recipe>.<task>" [label="<recipe> <task>\n:<ver>-r<0>\nvirtual:native:<bbpath>"]
-    
-                            arr = line.split('"')
-                            # Get recipe & task
-                            recpart = arr[1].split('.')
-                            recipe = recpart[0]
-                            # task = recpart[1]
-                            # Get version & release
-                            verstring = arr[3].split("\\n")[1]
-                            ver = verstring.split('-')[0][1:]
-                            rel = verstring.split('-')[1]
-    
-                            if recipe not in recipe_dict.keys():
-                                recipe_dict[recipe] = {
-                                    'ver': ver,
-                                    'rel': rel,
-                                    'children': [],
-                                    'processed': False
-                                }
-                        else:
-                            # "<recipe>.<task>" -> "<subrecipe>.<subtask>"
-    
-                            arr = line.split('"')
-                            # Get recipe & task
-                            recpart = arr[1].split('.')
-                            recipe = recpart[0]
-                            # task = recpart[1]
-                            # Get subrecipe & subtask
-                            subpart = arr[3].split('.')
-                            subrec = subpart[0]
-                            # subtask = subpart[1]
-    
-                            if subrec != recipe:
-                                if recipe in recipe_dict.keys():
-                                    found = False
-                                    for rec in recipe_dict[recipe]['children']:
-                                        if rec == subrec:
-                                            found = True
-                                            break
-                                    if not found:
-                                        recipe_dict[recipe]['children'].append(subrec)
-    
+            recipe_dict = BB.read_task_depends_dot(conf.task_depends_dot_file)
         except Exception as e:
             logging.error(f"Cannot read file '{conf.task_depends_dot_file}' - error '{e}'")
             sys.exit(2)
@@ -487,14 +768,19 @@ class BB:
 
             recipes_total = 0
 
-            for recipe in recipe_dict[conf.target]['children']:
+            graph = DependGraph(recipe_dict)
+            dependencies = graph.get_dependencies(conf.target, max_depth=conf.task_depends_max_depth,
+                                                  exclude_native=conf.task_depends_exclude_native)
+            logging.debug(f"- {len(dependencies)} dependencies of '{conf.target}' found in "
+                          f"'{conf.task_depends_dot_file}' ({graph.count()} recipes in graph)")
+
+            for recipe in dependencies:
                 if recipe in recipe_dict.keys():
                     if create_reclist:
                         rec_obj = Recipe(recipe, recipe_dict[recipe]['ver'], recipe_dict[recipe]['rel'])
                         if recipe in conf.exclude_recipes:
                             logging.info(f"Excluding recipe {recipe} due to --exclude_recipes list")
-                        elif not reclist.check_recipe_exists(recipe):
-                            reclist.recipes.append(rec_obj)
+                        elif reclist.add_recipe(rec_obj):
                             recipes_total += 1
                     else:
                         reclist.add_rel_to_recipe(recipe, recipe_dict[recipe]['rel'])
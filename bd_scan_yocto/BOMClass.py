@@ -8,16 +8,22 @@ import json
 from pathlib import Path
 import platform
 import asyncio
+import shlex
+import glob
 
 from .ComponentListClass import ComponentList
 from .ComponentClass import Component
 from .VulnListClass import VulnList
+from .DetectRunnerClass import DetectRunner
+from .CacheClass import Cache
 # from .RecipeListClass import RecipeList
 # from .ConfigClass import Config
 # from .SBOMClass import SBOM
 
 
 class BOM:
+    detect_cmd = ''
+
     def __init__(self, conf: "Config"):
         self.bdprojname = conf.bd_project
         self.bdvername = conf.bd_version
@@ -25,6 +31,7 @@ class BOM:
         self.vulnlist = VulnList()
         self.CVEPatchedVulnDict = {}
         self.CVEIgnoredVulnDict = {}
+        self.bdproj_dict = None
         self.bdver_dict = None
         self.projver = None
 
@@ -43,11 +50,54 @@ class BOM:
 
     def get_proj(self):
         logging.info(f"Working on project '{self.bdprojname}' version '{self.bdvername}'")
+        if self.bdver_dict:
+            # Version data already retrieved (or created) in this run
+            return True
         self.bdver_dict = self.get_projdata()
         if not self.bdver_dict:
             return False
         return True
 
+    def create_projver(self, conf: "Config"):
+        # Create project (or version within existing project) using the API - returns True if created
+        version_request = {
+            'versionName': self.bdvername,
+            'phase': 'DEVELOPMENT',
+            'distribution': 'EXTERNAL',
+        }
+        try:
+            if self.bdproj_dict:
+                url = self.bd.list_resources(self.bdproj_dict)['versions']
+                data = version_request
+            else:
+                url = f"{self.bd.base_url}/api/projects"
+                data = {
+                    'name': self.bdprojname,
+                    'versionRequest': version_request,
+                }
+            res = self.bd.session.post(url, json=data)
+            if res.status_code != 201:
+                raise Exception(f"Return code {res.status_code} - {res.text}")
+
+            location = res.headers['Location']
+            if self.bdproj_dict:
+                self.bdver_dict = self.bd.get_json(location)
+            else:
+                self.bdproj_dict = self.bd.get_json(location)
+                for v in self.bd.get_resource('versions', parent=self.bdproj_dict):
+                    if v['versionName'] == self.bdvername:
+                        self.bdver_dict = v
+                        break
+            if not self.bdver_dict:
+                raise Exception("Created version not found")
+
+            logging.info(f"Created project '{self.bdprojname}' version '{self.bdvername}' using API")
+            return True
+
+        except Exception as e:
+            logging.warning(f"Unable to create project version using API - {e}")
+        return False
+
     def get_comps(self):
         self.complist = ComponentList()  # Reset component list
 
@@ -116,6 +166,7 @@ class BOM:
         projects = self.bd.get_resource('projects', params=params)
         for p in projects:
             if p['name'] == self.bdprojname:
+                self.bdproj_dict = p
                 versions = self.bd.get_resource('versions', parent=p, params=params)
                 for v in versions:
                     if v['versionName'] == self.bdvername:
@@ -361,35 +412,9 @@ class BOM:
             logging.error(f"Unable to process CVE file {cve_file}: {e}")
         return False
 
-    def run_detect_sigscan(self, conf: "Config", tdir, extra_opt=''):
-        import shutil
-
-        cmd = self.get_detect(conf)
-
-        detect_cmd = cmd
-        detect_cmd += f" --detect.source.path='{tdir}' --detect.project.name='{conf.bd_project}' " + \
-                      f"--detect.project.version.name='{conf.bd_version}' "
-        detect_cmd += f"--blackduck.url={conf.bd_url} "
-        detect_cmd += f"--blackduck.api.token={conf.bd_api} "
-        if conf.bd_trustcert:
-            detect_cmd += "--blackduck.trust.cert=true "
-        detect_cmd += "--detect.wait.for.results=true "
-        if 'detect.timeout' not in conf.detect_opts:
-            detect_cmd += f"--detect.timeout={conf.api_timeout} "
-        if extra_opt != '':
-            detect_cmd += f"{extra_opt} "
-
-        if conf.detect_opts:
-            detect_cmd += conf.detect_opts
-
-        logging.debug(f"Detect Sigscan cmd '{detect_cmd}'")
-        # output = subprocess.check_output(detect_cmd, stderr=subprocess.STDOUT)
-        # mystr = output.decode("utf-8").strip()
-        # lines = mystr.splitlines()
-        retval = os.system(detect_cmd)
-        shutil.rmtree(tdir)
-
-        if retval != 0:
+    def run_detect_sigscan(self, conf: "Config", tdir, extra_opt='', cleanup=True, label='Detect'):
+        runner = self.start_detect_sigscan(conf, tdir, extra_opt=extra_opt, cleanup=cleanup, label=label)
+        if runner is None or not runner.wait():
             logging.error("Unable to run Detect Signature scan on package files")
             return False
         else:
@@ -397,36 +422,201 @@ class BOM:
 
         return True
 
+    def start_detect_sigscan(self, conf: "Config", tdir, extra_opt='', cleanup=True, label='Detect'):
+        # Starts Detect in the background - call wait() on the returned DetectRunner for the result
+        cmd = self.get_detect(conf)
+
+        try:
+            detect_cmd = shlex.split(cmd)
+            if extra_opt != '':
+                extra_cmd = shlex.split(extra_opt)
+            else:
+                extra_cmd = []
+            if conf.detect_opts:
+                opts_cmd = shlex.split(conf.detect_opts)
+            else:
+                opts_cmd = []
+        except ValueError as e:
+            logging.error(f"Unable to parse Detect command/options '{cmd} {extra_opt} {conf.detect_opts}': {e}")
+            return None
+
+        detect_cmd += [f"--detect.source.path={tdir}", f"--detect.project.name={conf.bd_project}",
+                       f"--detect.project.version.name={conf.bd_version}"]
+        detect_cmd.append(f"--blackduck.url={conf.bd_url}")
+        detect_cmd.append(f"--blackduck.api.token={conf.bd_api}")
+        if conf.bd_trustcert:
+            detect_cmd.append("--blackduck.trust.cert=true")
+        detect_cmd.append("--detect.wait.for.results=true")
+        if 'detect.timeout' not in conf.detect_opts:
+            detect_cmd.append(f"--detect.timeout={conf.api_timeout}")
+        detect_cmd += extra_cmd
+        detect_cmd += opts_cmd
+
+        logging.debug(f"Detect Sigscan cmd '{' '.join(detect_cmd)}'")
+        runner = DetectRunner(detect_cmd, timeout=conf.detect_timeout, cleanup_dir=(tdir if cleanup else ''),
+                              label=label, env=self.get_detect_env(conf))
+        runner.start()
+        return runner
+
     @staticmethod
     def get_detect(conf: "Config"):
         cmd = ''
         if not conf.detect_jar:
-            tdir = os.path.join(str(Path.home()), "bd-detect")
-            if not os.path.isdir(tdir):
-                os.mkdir(tdir)
-            tdir = os.path.join(tdir, "download")
-            if not os.path.isdir(tdir):
-                os.mkdir(tdir)
-            if not os.path.isdir(tdir):
-                logging.error("Cannot create bd-detect folder in $HOME")
+            if BOM.detect_cmd:
+                # Launcher already resolved in this run
+                return BOM.detect_cmd
+            tdir = BOM.get_detect_dir()
+            jar = BOM.find_cached_detect_jar(tdir, conf.detect_version)
+            if jar and (conf.detect_offline or conf.detect_version):
+                # Cached jar for pinned version (or offline) - run directly without the Detect script
+                logging.info(f"Using cached BD Detect jar {jar}")
+                cmd = "java -jar " + shlex.quote(jar)
+            elif conf.detect_offline:
+                logging.error(f"--detect_offline specified but no cached BD Detect jar found in {tdir} - run once "
+                              f"online or use --detect_jar_path option")
                 sys.exit(2)
-            shpath = os.path.join(tdir, 'detect11.sh')
-
-            j = requests.get("https://detect.blackduck.com/detect11.sh")
-            if j.ok:
-                with open(shpath, 'wb') as f:
-                    f.write(j.content)
+            else:
+                shpath = BOM.get_detect_script(conf, tdir)
                 if not os.path.isfile(shpath):
                     logging.error("Cannot download BD Detect shell script -"
                                   " download manually and use --detect-jar-path option")
                     sys.exit(2)
 
-                cmd = "/bin/bash " + shpath + " "
+                cmd = "/bin/bash " + shlex.quote(shpath) + " "
+            BOM.detect_cmd = cmd
         else:
-            cmd = "java -jar " + conf.detect_jar
+            cmd = "java -jar " + shlex.quote(conf.detect_jar)
 
         return cmd
 
+    @staticmethod
+    def prepare_detect_jar(conf: "Config"):
+        # Downloads the Detect jar once (Detect script with DETECT_DOWNLOAD_ONLY) before concurrent scans so they
+        # run the jar directly instead of each Detect script downloading the same jar into the shared folder
+        cmd = BOM.get_detect(conf)
+        if conf.detect_jar or not cmd.startswith('/bin/bash '):
+            return True
+        env = BOM.get_detect_env(conf)
+        env['DETECT_DOWNLOAD_ONLY'] = '1'
+        runner = DetectRunner(shlex.split(cmd), timeout=conf.detect_timeout, label='Detect (download)', env=env)
+        runner.start()
+        jar = ''
+        if runner.wait():
+            jar = BOM.find_cached_detect_jar(env['DETECT_JAR_DOWNLOAD_DIR'], conf.detect_version)
+        if not jar:
+            logging.error("Unable to download BD Detect jar")
+            return False
+        logging.info(f"Using BD Detect jar {jar} for concurrent scans")
+        BOM.detect_cmd = "java -jar " + shlex.quote(jar)
+        return True
+
+    @staticmethod
+    def codelocation_name_matches(name, base):
+        # Detect appends the code location type to the specified name (for example 'NAME scan')
+        return name == base or name.startswith(base + ' ')
+
+    @staticmethod
+    def is_stale_codelocation(name, prefix, keep_names, remove_names=()):
+        if any(BOM.codelocation_name_matches(name, keep) for keep in keep_names):
+            return False
+        return name.startswith(prefix) or any(BOM.codelocation_name_matches(name, remove) for remove in remove_names)
+
+    def remove_stale_codelocations(self, conf: "Config", prefix, keep_names, remove_names=()):
+        # Deletes code locations in the project version named with prefix (or matching remove_names) which do not
+        # match keep_names (for example shard code locations left from a previous scan with more shards) - returns
+        # number not removed
+        if not self.get_proj():
+            return 0
+        failed = 0
+        try:
+            for codeloc in self.bd.get_resource('codelocations', parent=self.bdver_dict):
+                name = codeloc.get('name', '')
+                if not self.is_stale_codelocation(name, prefix, keep_names, remove_names):
+                    continue
+                res = self.bd.session.delete(codeloc['_meta']['href'])
+                if res.ok:
+                    logging.info(f"- Deleted code location '{name}' left from previous scan")
+                else:
+                    logging.warning(f"- Unable to delete code location '{name}' left from previous scan "
+                                    f"(status {res.status_code}) - results will remain in project version")
+                    failed += 1
+        except Exception as e:
+            logging.warning(f"Unable to check code locations in project version - {e}")
+            failed += 1
+        return failed
+
+    @staticmethod
+    def get_detect_env(conf: "Config"):
+        # Detect script downloads the jar into the cache folder (and uses a pinned version if specified)
+        env = os.environ.copy()
+        if not conf.detect_jar:
+            env.setdefault('DETECT_JAR_DOWNLOAD_DIR', BOM.get_detect_dir())
+            if conf.detect_version:
+                env['DETECT_LATEST_RELEASE_VERSION'] = conf.detect_version
+        return env
+
+    @staticmethod
+    def get_detect_dir():
+        tdir = os.path.join(str(Path.home()), "bd-detect")
+        if not os.path.isdir(tdir):
+            os.mkdir(tdir)
+        tdir = os.path.join(tdir, "download")
+        if not os.path.isdir(tdir):
+            os.mkdir(tdir)
+        if not os.path.isdir(tdir):
+            logging.error("Cannot create bd-detect folder in $HOME")
+            sys.exit(2)
+        return tdir
+
+    @staticmethod
+    def find_cached_detect_jar(tdir, version=''):
+        # Returns pinned version jar, or most recently downloaded jar if no version specified
+        if version:
+            jar = os.path.join(tdir, f"detect-{version}.jar")
+            return jar if os.path.isfile(jar) else ''
+        jars = sorted(glob.glob(os.path.join(tdir, "detect-*.jar")), key=os.path.getmtime)
+        if len(jars) > 0:
+            return jars[-1]
+        return ''
+
+    @staticmethod
+    def get_detect_script(conf: "Config", tdir):
+        # Detect script is downloaded again only when older than --detect_cache_ttl, and then only if changed
+        shpath = os.path.join(tdir, 'detect11.sh')
+        metafile = shpath + '.json'
+        meta = Cache.load_json(metafile) if os.path.isfile(shpath) else None
+        if meta is None:
+            meta = {}
+        elif time.time() - meta.get('checked', 0) < conf.detect_cache_ttl * 3600:
+            logging.info(f"Using cached BD Detect script {shpath}")
+            return shpath
+
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        try:
+            j = requests.get("https://detect.blackduck.com/detect11.sh", headers=headers, timeout=conf.api_timeout)
+            if j.status_code == 304:
+                logging.info(f"Cached BD Detect script {shpath} is unchanged")
+            elif j.ok:
+                with open(shpath + '.tmp', 'wb') as f:
+                    f.write(j.content)
+                os.replace(shpath + '.tmp', shpath)
+                meta['etag'] = j.headers.get('ETag', '')
+                meta['last_modified'] = j.headers.get('Last-Modified', '')
+                logging.info(f"Downloaded BD Detect script {shpath}")
+            else:
+                logging.warning(f"Unable to download BD Detect script - status {j.status_code}")
+                return shpath
+            meta['checked'] = time.time()
+            Cache.save_json(metafile, meta)
+        except requests.exceptions.RequestException as e:
+            # Use previously downloaded script if available
+            logging.warning(f"Unable to download BD Detect script - {e}")
+        return shpath
+
     def check_recipe_in_bom(self, rec: "RecipeClass"):
         return self.complist.check_recipe_in_list(rec)
 
@@ -0,0 +1,60 @@
+import os
+import json
+import logging
+import hashlib
+import tempfile
+
+
+class Cache:
+    @staticmethod
+    def get_path(conf: "Config", filename):
+        # Returns path of file within --cache_dir (empty if caching not enabled)
+        if not conf.cache_dir:
+            return ''
+        return os.path.join(conf.cache_dir, filename)
+
+    @staticmethod
+    def load_json(cfile):
+        if not cfile or not os.path.isfile(cfile):
+            return None
+        try:
+            with open(cfile, "r") as infile:
+                return json.load(infile)
+        except Exception as e:
+            logging.warning(f"Unable to read cache file '{cfile}' - {e}")
+        return None
+
+    @staticmethod
+    def save_json(cfile, data):
+        if not cfile:
+            return False
+        try:
+            # Write to temp file and rename so an interrupted run cannot leave a truncated cache file
+            fd, tfile = tempfile.mkstemp(dir=os.path.dirname(cfile), prefix=".tmp_")
+            with os.fdopen(fd, "w") as outfile:
+                json.dump(data, outfile)
+            os.replace(tfile, cfile)
+            return True
+        except Exception as e:
+            logging.warning(f"Unable to write cache file '{cfile}' - {e}")
+        return False
+
+    @staticmethod
+    def fingerprint(values):
+        # Hash of a list of strings
+        sha = hashlib.sha256()
+        for val in values:
+            sha.update(str(val).encode('utf-8', errors='replace'))
+            sha.update(b'\0')
+        return sha.hexdigest()
+
+    @staticmethod
+    def file_fingerprint(path):
+        # Hash of file content (empty string if file does not exist)
+        if not os.path.isfile(path):
+            return ''
+        sha = hashlib.sha256()
+        with open(path, "rb") as infile:
+            for block in iter(lambda: infile.read(1024 * 1024), b''):
+                sha.update(block)
+        return sha.hexdigest()
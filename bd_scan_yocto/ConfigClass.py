@@ -2,6 +2,8 @@ import argparse
 import logging
 import os
 import sys
+import re
+import shlex
 from .OEClass import OE
 
 script_version = "v1.4.3"
@@ -73,6 +75,14 @@ class Config:
                                  "command (if 'license.manifest' is not also specified, will process ALL recipes "
                                  "including dev dependencies, --target is also required)",
                             default="")
+        parser.add_argument("--task_depends_max_depth", type=int,
+                            help="OPTIONAL Dependency depth below --target to process from --task_depends_dot_file "
+                                 "(default 1 = direct dependencies only, 0 = full transitive closure)",
+                            default=1)
+        parser.add_argument("--task_depends_exclude_native",
+                            help="OPTIONAL Exclude -native and nativesdk- recipes (and their dependencies) when "
+                                 "processing --task_depends_dot_file",
+                            action='store_true')
         parser.add_argument("-c", "--cve_check_file", type=str,
                             help="OPTIONAL CVE check output file to mark locally patched CVEs as patched in project",
                             default="")
@@ -94,6 +104,10 @@ class Config:
         parser.add_argument("--skip_bitbake",
                             help="Do not run 'bitbake -e' or 'bitbake-layers show-recipes' commands to extract data",
                             action='store_true')
+        parser.add_argument("--bitbake_timeout", type=int,
+                            help="OPTIONAL Timeout in seconds for each of the 'bitbake -e' and 'bitbake-layers "
+                                 "show-recipes' commands (default 120)",
+                            default=120)
         parser.add_argument("-o", "--output", type=str,
                             help="OPTIONAL Specify output SBOM SPDX file for manual upload (if specified then BD "
                                  "project will not be created automatically and CVE patching not supported)",
@@ -105,12 +119,40 @@ class Config:
                             action='store_true')
         parser.add_argument("--oe_data_folder", type=str,
                             help="Folder to contain OE data files - if files do not exist they will be downloaded, "
-                                 "if files exist then will be used without download",
+                                 "if files exist then will be used until older than --oe_data_ttl hours and then "
+                                 "revalidated against the server (ETag/Last-Modified) and downloaded again only if "
+                                 "changed (use --oe_data_ttl 0 to always use existing files without revalidation)",
+                            default="")
+        parser.add_argument("--oe_recipes_scoped",
+                            help="OPTIONAL Only get OE recipes with names used in the build (filtered layerindex "
+                                 "queries) instead of downloading all OE recipes",
+                            action='store_true')
+        parser.add_argument("--oe_data_ttl", type=int,
+                            help="OPTIONAL Hours after which OE data files in --oe_data_folder are revalidated against "
+                                 "the server and downloaded again if changed (default 168, 0 = never revalidate)",
+                            default=168)
+        parser.add_argument("--cache_dir", type=str,
+                            help="OPTIONAL Folder to cache data between runs (for example 'bitbake -e' and "
+                                 "'bitbake-layers show-recipes' output, reused while the build configuration is "
+                                 "unchanged) - created if it does not exist",
                             default="")
+        parser.add_argument("--cache_refresh",
+                            help="OPTIONAL Ignore cached 'bitbake -e' and 'bitbake-layers show-recipes' output in "
+                                 "--cache_dir and run the commands again (cache is updated)",
+                            action='store_true')
         parser.add_argument("--max_oe_version_distance", type=str,
                             help="Where no exact match, use closest previous recipe version up to specified distance."
                                  "Distance should be specified as MAJOR.MINOR.PATCH (e.g. 0.1.0)",
                             default='0.0.0')
+        parser.add_argument("--oe_branch", type=str,
+                            help="OPTIONAL OE release branch of the build (e.g. scarthgap) - close version matches "
+                                 "are searched in this and neighbouring branches first (default from "
+                                 "LAYERSERIES_CORENAMES/DISTRO_CODENAME in bitbake -e, 'all' = search all branches)",
+                            default="")
+        parser.add_argument("--oe_match_workers", type=int,
+                            help="OPTIONAL Number of worker processes used to match recipes against OE data "
+                                 "(default 1 = match serially)",
+                            default=1)
 
         parser.add_argument("--add_comps_by_cpe",
                             help="LEGACY PARAMETER - Use CPE to add recipes not matched by OE lookup or signature "
@@ -135,12 +177,44 @@ class Config:
                             help="LEGACY PARAMETER - Signature scan all packages (only recipes not matched from OE "
                                  "data are scanned by default) - replace with '--modes SIG_SCAN_ALL'",
                             action='store_true')
+        parser.add_argument("--sig_scan_staging", type=str, choices=['link', 'copy'],
+                            help="OPTIONAL How package/download files are staged for signature scan - 'link' uses "
+                                 "reflinks or hardlinks where possible and copies only across filesystems, 'copy' "
+                                 "always copies (default 'link')",
+                            default="link")
+        parser.add_argument("--sig_scan_staging_dir", type=str,
+                            help="OPTIONAL Folder in which to stage files for signature scan (default system temp "
+                                 "folder - use a folder on the same filesystem as the build to allow linking)",
+                            default="")
+        parser.add_argument("--sig_scan_shards", type=int,
+                            help="OPTIONAL Split files for signature scan by size into the specified number of "
+                                 "folders and run concurrent Detect scans (one code location per shard - default 1)",
+                            default=1)
         parser.add_argument("--detect_jar_path", type=str,
                             help="OPTIONAL BD Detect jar path",
                             default="")
+        parser.add_argument("--create_project_via_detect",
+                            help="OPTIONAL Create new project version by running Detect on an empty folder instead of "
+                                 "using the Black Duck API",
+                            action='store_true')
+        parser.add_argument("--detect_version", type=str,
+                            help="OPTIONAL Pin BD Detect version (e.g. 11.0.0) - cached jar for this version in "
+                                 "$HOME/bd-detect/download is run directly if it exists",
+                            default="")
+        parser.add_argument("--detect_offline",
+                            help="OPTIONAL Run cached BD Detect jar from $HOME/bd-detect/download without "
+                                 "downloading the Detect script",
+                            action='store_true')
+        parser.add_argument("--detect_cache_ttl", type=int,
+                            help="OPTIONAL Hours before cached BD Detect script is revalidated (default 24)",
+                            default=24)
         parser.add_argument("--detect_opts", type=str,
                             help="OPTIONAL Additional BD Detect options (remove leading '--')",
                             default="")
+        parser.add_argument("--detect_timeout", type=int,
+                            help="OPTIONAL Wall-clock limit in seconds for each Detect run - Detect is terminated "
+                                 "if exceeded (default 0 = no limit)",
+                            default=0)
         parser.add_argument("--api_timeout", type=int,
                             help="OPTIONAL API and Detect timeout in seconds (default 600)",
                             default=600)
@@ -174,28 +248,49 @@ class Config:
         self.bd_api = ''
         self.bd_trustcert = False
         self.skip_bitbake = args.skip_bitbake
+        self.bitbake_timeout = args.bitbake_timeout
         self.license_manifest = ''
         self.image_license_manifest = ''
         self.process_image_manifest = False
         self.target = args.target
         self.machine = args.machine
         self.task_depends_dot_file = ''
+        self.task_depends_max_depth = args.task_depends_max_depth
+        self.task_depends_exclude_native = args.task_depends_exclude_native
         self.bitbake_layers_file = ''
         self.cve_check_file = ''
         self.skip_oe_data = args.skip_oe_data
         self.max_oe_version_distance = []
         self.oe_data_folder = args.oe_data_folder
+        self.oe_data_ttl = args.oe_data_ttl
+        self.oe_recipes_scoped = args.oe_recipes_scoped
+        self.oe_match_workers = args.oe_match_workers
+        self.oe_branch = args.oe_branch
+        self.cache_dir = args.cache_dir
+        self.cache_refresh = args.cache_refresh
         self.package_dir = ''
         self.download_dir = ''
         self.deploy_dir = ''
         self.build_dir = ''
         self.log_dir = ''
+        self.pkgdata_dir = ''
+        self.buildhistory_dir = ''
+        self.distro_codename = ''
+        self.layerseries_corenames = ''
         self.image_package_type = args.image_package_type
         self.run_sig_scan = False
         self.scan_all_packages = False
+        self.sig_scan_staging = args.sig_scan_staging
+        self.sig_scan_staging_dir = args.sig_scan_staging_dir
+        self.sig_scan_shards = args.sig_scan_shards
         self.detect_jar = ''
         self.detect_opts = ''
+        self.create_project_via_detect = args.create_project_via_detect
+        self.detect_version = args.detect_version
+        self.detect_offline = args.detect_offline
+        self.detect_cache_ttl = args.detect_cache_ttl
         self.api_timeout = args.api_timeout
+        self.detect_timeout = args.detect_timeout
         self.run_custom_components = False
         self.cve_check_dir = ''
         self.license_dir = ''
@@ -372,6 +467,11 @@ class Config:
                 else:
                     self.task_depends_dot_file = args.task_depends_dot_file
 
+        if self.task_depends_max_depth < 0:
+            logging.error(f"Invalid --task_depends_max_depth {self.task_depends_max_depth} specified - should be 0 "
+                          f"or greater")
+            terminate = True
+
         if args.bitbake_layers_file:
             if not os.path.exists(args.bitbake_layers_file):
                 logging.error(f"Bitbake layers command output file '{args.bitbake_layers_file}' does not exist")
@@ -401,6 +501,32 @@ class Config:
             logging.error(f"OE_data_folder {self.oe_data_folder} does not exist")
             terminate = True
 
+        if self.cache_dir and not os.path.isdir(self.cache_dir):
+            try:
+                os.makedirs(self.cache_dir)
+            except OSError as e:
+                logging.error(f"Unable to create cache_dir {self.cache_dir} - {e}")
+                terminate = True
+
+        if self.oe_data_ttl < 0:
+            logging.error(f"Invalid --oe_data_ttl {self.oe_data_ttl} specified - should be 0 or greater")
+            terminate = True
+
+        if self.oe_match_workers < 1:
+            logging.error(f"Invalid --oe_match_workers {self.oe_match_workers} specified - should be 1 or greater")
+            terminate = True
+
+        if self.sig_scan_shards < 1:
+            logging.error(f"Invalid --sig_scan_shards {self.sig_scan_shards} specified - should be 1 or greater")
+            terminate = True
+
+        if self.sig_scan_staging_dir and not os.path.isdir(self.sig_scan_staging_dir):
+            try:
+                os.makedirs(self.sig_scan_staging_dir)
+            except OSError as e:
+                logging.error(f"Unable to create sig_scan_staging_dir {self.sig_scan_staging_dir} - {e}")
+                terminate = True
+
         if args.package_dir:
             if not os.path.exists(args.package_dir):
                 logging.error(f"Specified package dir '{args.package_dir}' does not exist")
@@ -460,6 +586,16 @@ class Config:
             self.detect_opts = ' '.join(
                 '--' + t if t.startswith('detect') else t for t in args.detect_opts.split()
             )
+            try:
+                shlex.split(self.detect_opts)
+            except ValueError as e:
+                logging.error(f"Invalid --detect_opts value '{args.detect_opts}': {e}")
+                terminate = True
+            if not self.create_project_via_detect and \
+                    re.search(r'detect\.project\.(?!codelocation)', self.detect_opts) is not None:
+                # Project settings in Detect options are only applied if Detect creates the project
+                logging.info("New project version will be created by Detect (project options in --detect_opts)")
+                self.create_project_via_detect = True
 
         if args.exclude_recipes != '':
             self.exclude_recipes = args.exclude_recipes.split(',')
@@ -0,0 +1,72 @@
+import logging
+from array import array
+from collections import deque
+
+
+class DependGraph:
+    def __init__(self, recipe_dict):
+        # Recipe names are interned as integer node ids with CSR (offset/target array) adjacency
+        self.names = []
+        self.nameid_dict = {}
+        self.offsets = array('l', [0])
+        self.targets = array('l')
+
+        for recipe in recipe_dict.keys():
+            self.get_id(recipe)
+
+        # Child recipes which are not declared as nodes are given ids (with no children) as they are seen
+        nodeid = 0
+        while nodeid < len(self.names):
+            recipe = self.names[nodeid]
+            if recipe in recipe_dict:
+                self.targets.extend([self.get_id(child) for child in recipe_dict[recipe]['children']])
+            self.offsets.append(len(self.targets))
+            nodeid += 1
+
+        logging.debug(f"Dependency graph - {len(self.names)} nodes, {len(self.targets)} edges")
+
+    def get_id(self, recipe):
+        nodeid = self.nameid_dict.get(recipe)
+        if nodeid is None:
+            nodeid = len(self.names)
+            self.nameid_dict[recipe] = nodeid
+            self.names.append(recipe)
+        return nodeid
+
+    def count(self):
+        return len(self.names)
+
+    @staticmethod
+    def is_native(recipe):
+        return recipe.endswith('-native') or recipe.startswith('nativesdk-')
+
+    def get_dependencies(self, root, max_depth=0, exclude_native=False):
+        # Iterative BFS from root - returns dependency names in BFS order (root not included)
+        # max_depth 0 = full transitive closure, 1 = direct dependencies only
+        rootid = self.nameid_dict.get(root)
+        if rootid is None:
+            return []
+
+        depth = array('l', [-1]) * len(self.names)
+        depth[rootid] = 0
+        queue = deque([rootid])
+        dependencies = []
+        offsets = self.offsets
+        targets = self.targets
+
+        while queue:
+            nodeid = queue.popleft()
+            node_depth = depth[nodeid]
+            if 0 < max_depth <= node_depth:
+                continue
+            for index in range(offsets[nodeid], offsets[nodeid + 1]):
+                childid = targets[index]
+                if depth[childid] != -1:
+                    continue
+                depth[childid] = node_depth + 1
+                if exclude_native and self.is_native(self.names[childid]):
+                    continue
+                dependencies.append(self.names[childid])
+                queue.append(childid)
+
+        return dependencies
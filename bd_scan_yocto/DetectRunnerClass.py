@@ -0,0 +1,122 @@
+import os
+import re
+import atexit
+import shutil
+import signal
+import logging
+import subprocess
+import threading
+import time
+
+# Detect output lines reporting code location/scan IDs and durations
+detect_id_pattern = re.compile(r'(code location|scan)[\w ]*?\b(id|name)\s*[:=]\s*(\S.*)', re.IGNORECASE)
+detect_duration_pattern = re.compile(r'([A-Za-z][\w ]*?)\s+(?:duration|took)\s*[:=]?\s*(\d[\w .:]*)', re.IGNORECASE)
+
+
+class DetectRunner:
+    # Runs Detect as a subprocess (optionally in the background) with output streamed to the logger
+    def __init__(self, command: list, timeout=0, cleanup_dir='', label='Detect', env=None):
+        self.command = command
+        self.env = env
+        self.timeout = timeout
+        self.cleanup_dir = cleanup_dir
+        self.label = label
+        self.proc = None
+        self.reader = None
+        self.timer = None
+        self.timed_out = False
+        self.start_time = 0
+        self.duration = 0
+        self.retval = None
+        self.ids = {}
+        self.durations = {}
+
+    def start(self):
+        logging.info(f"{self.label}: starting")
+        self.start_time = time.time()
+        try:
+            # Own process group so the JVM started by the Detect script is also killed on timeout
+            self.proc = subprocess.Popen(self.command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                                         errors='replace', env=self.env, start_new_session=(os.name == 'posix'))
+        except OSError as e:
+            logging.error(f"{self.label}: unable to run Detect - {e}")
+            self.retval = -1
+            return False
+
+        if self.timeout > 0:
+            self.timer = threading.Timer(self.timeout, self.kill_on_timeout)
+            self.timer.start()
+        self.reader = threading.Thread(target=self.read_output, daemon=True)
+        self.reader.start()
+        # Detect runs in its own session so would not be stopped if this script exits before wait() is called
+        atexit.register(self.terminate)
+        return True
+
+    def read_output(self):
+        for line in self.proc.stdout:
+            line = line.rstrip()
+            if not line:
+                continue
+            logging.info(f"{self.label}> {line}")
+            self.parse_line(line)
+        self.proc.stdout.close()
+
+    def parse_line(self, line):
+        res = detect_id_pattern.search(line)
+        if res is not None:
+            self.ids[f"{res.group(1).lower()} {res.group(2).lower()}"] = res.group(3)
+        res = detect_duration_pattern.search(line)
+        if res is not None:
+            self.durations[res.group(1).strip()] = res.group(2).strip()
+
+    def kill(self, sig=signal.SIGKILL):
+        try:
+            if os.name == 'posix':
+                os.killpg(self.proc.pid, sig)
+            elif sig == signal.SIGKILL:
+                self.proc.kill()
+            else:
+                self.proc.terminate()
+        except OSError:
+            pass
+
+    def kill_on_timeout(self):
+        self.timed_out = True
+        logging.error(f"{self.label}: exceeded time limit of {self.timeout} seconds - terminating")
+        self.kill()
+
+    def terminate(self, grace=10):
+        # Stops Detect if still running (SIGTERM then SIGKILL after grace seconds) - result is treated as failed
+        if not self.is_running():
+            return
+        logging.warning(f"{self.label}: terminating")
+        self.kill(signal.SIGTERM)
+        try:
+            self.proc.wait(timeout=grace)
+        except subprocess.TimeoutExpired:
+            self.kill()
+        self.wait()
+
+    def is_running(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def wait(self):
+        # Returns True if Detect completed successfully
+        if self.proc is not None and self.retval is None:
+            self.retval = self.proc.wait()
+            atexit.unregister(self.terminate)
+            self.reader.join()
+            if self.timer is not None:
+                self.timer.cancel()
+            self.duration = time.time() - self.start_time
+
+            if self.cleanup_dir:
+                shutil.rmtree(self.cleanup_dir, ignore_errors=True)
+
+            for key, val in self.ids.items():
+                logging.info(f"{self.label}: {key} {val}")
+            for key, val in self.durations.items():
+                logging.debug(f"{self.label}: {key} duration {val}")
+            logging.info(f"{self.label}: completed with return code {self.retval} in {self.duration:.1f} seconds")
+
+        return self.retval == 0 and not self.timed_out
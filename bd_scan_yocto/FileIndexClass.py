@@ -0,0 +1,149 @@
+import os
+import glob
+import atexit
+import logging
+import sqlite3
+
+from .CacheClass import Cache
+
+
+class FileIndex:
+    indexes = {}
+
+    def __init__(self, dbfile):
+        self.dbfile = dbfile
+        self.db = sqlite3.connect(dbfile)
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, mtime INTEGER);
+            CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, dir TEXT, basename TEXT, size INTEGER,
+                                              mtime INTEGER, type TEXT);
+            CREATE INDEX IF NOT EXISTS files_dir ON files (dir);
+            CREATE INDEX IF NOT EXISTS files_basename ON files (basename);
+        ''')
+
+    @staticmethod
+    def get_index(conf: "Config"):
+        # Index is persisted in --cache_dir (None if not specified)
+        dbfile = Cache.get_path(conf, 'file_index.db')
+        if not dbfile:
+            return None
+        if dbfile not in FileIndex.indexes:
+            FileIndex.indexes[dbfile] = FileIndex(dbfile)
+        return FileIndex.indexes[dbfile]
+
+    @staticmethod
+    def close_all():
+        for findex in FileIndex.indexes.values():
+            findex.db.close()
+        FileIndex.indexes = {}
+
+    @staticmethod
+    def find_files(conf: "Config", root, pattern='*', recursive=True):
+        # Returns paths below root matching glob pattern on basename - uses the index if --cache_dir specified,
+        # otherwise glob (an index built for a single run would stat every file)
+        findex = FileIndex.get_index(conf)
+        if findex is None:
+            if recursive:
+                return glob.glob(os.path.join(root, '**', pattern), recursive=True)
+            return glob.glob(os.path.join(root, pattern))
+        findex.refresh(root, recursive=recursive)
+        return [path for path, size, mtime in findex.get_files(root, pattern, recursive=recursive)]
+
+    @staticmethod
+    def find_latest_file(conf: "Config", root, pattern='*', recursive=True):
+        # Most recently modified matching file - candidates are stat'ed again as a file rewritten in place does not
+        # change the folder mtime used to refresh the index
+        latest = ''
+        latest_mtime = 0
+        for path in FileIndex.find_files(conf, root, pattern, recursive):
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            if latest == '' or mtime >= latest_mtime:
+                latest, latest_mtime = path, mtime
+        return latest
+
+    def refresh(self, root, recursive=True):
+        # Rescan only folders whose mtime has changed since last indexed
+        root = os.path.normpath(root)
+        scanned = 0
+        stack = [root]
+        seen = set()
+        while stack:
+            folder = stack.pop()
+            try:
+                st = os.stat(folder)
+            except OSError:
+                self.remove_dir(folder)
+                continue
+            # Do not follow symlinked folder loops
+            if (st.st_dev, st.st_ino) in seen:
+                continue
+            seen.add((st.st_dev, st.st_ino))
+            mtime = st.st_mtime_ns
+
+            row = self.db.execute("SELECT mtime FROM dirs WHERE path = ?", (folder,)).fetchone()
+            if row is not None and row[0] == mtime:
+                subdirs = [sub for (sub,) in self.db.execute(
+                    "SELECT path FROM files WHERE dir = ? AND type = 'd'", (folder,))]
+            else:
+                subdirs = self.scan_dir(folder, mtime)
+                scanned += 1
+
+            if recursive:
+                stack += subdirs
+
+        self.db.commit()
+        logging.debug(f"File index: refreshed '{root}' ({scanned} folders rescanned)")
+
+    def scan_dir(self, folder, mtime):
+        entries = []
+        subdirs = []
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    if entry.name.startswith('.'):
+                        continue
+                    # is_dir() uses d_type so folders are not stat'ed
+                    if entry.is_dir():
+                        entries.append((entry.path, folder, entry.name, 0, 0, 'd'))
+                        subdirs.append(entry.path)
+                    else:
+                        try:
+                            st = entry.stat()
+                        except OSError:
+                            continue
+                        entries.append((entry.path, folder, entry.name, st.st_size, st.st_mtime_ns, 'f'))
+        except OSError as e:
+            logging.debug(f"File index: unable to scan '{folder}' - {e}")
+
+        # Remove folders which no longer exist from the index
+        for (sub,) in self.db.execute("SELECT path FROM files WHERE dir = ? AND type = 'd'", (folder,)).fetchall():
+            if sub not in subdirs:
+                self.remove_dir(sub)
+        self.db.execute("DELETE FROM files WHERE dir = ?", (folder,))
+        self.db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)", entries)
+        self.db.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?)", (folder, mtime))
+        return subdirs
+
+    def remove_dir(self, folder):
+        # Remove folder and everything below it
+        low, high = folder + os.sep, folder + chr(ord(os.sep) + 1)
+        self.db.execute("DELETE FROM files WHERE path = ? OR (path > ? AND path < ?)", (folder, low, high))
+        self.db.execute("DELETE FROM dirs WHERE path = ? OR (path > ? AND path < ?)", (folder, low, high))
+
+    def get_files(self, root, pattern='*', recursive=True):
+        # Returns list of (path, size, mtime) for entries matching the glob pattern on basename
+        root = os.path.normpath(root)
+        if recursive:
+            low, high = root + os.sep, root + chr(ord(os.sep) + 1)
+            rows = self.db.execute("SELECT path, size, mtime FROM files WHERE path > ? AND path < ? "
+                                   "AND basename GLOB ? ORDER BY path", (low, high, pattern))
+        else:
+            rows = self.db.execute("SELECT path, size, mtime FROM files WHERE dir = ? AND basename GLOB ? "
+                                   "ORDER BY path", (root, pattern))
+        return rows.fetchall()
+
+
+atexit.register(FileIndex.close_all)
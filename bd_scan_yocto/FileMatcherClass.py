@@ -0,0 +1,55 @@
+import re
+
+
+class FileMatcher:
+    # Matches download/package file basenames to recipes by name lookup instead of a regex per recipe:
+    #   download - ^{recipe}[_-]v?{version}[.-].*$
+    #   package  - ^(lib)?{recipe}\d*[_-]v?{version}[+.-].*\.{image_package_type}
+    # Every [_-] separator in the basename is tried as the end of the recipe name so names containing
+    # separators (and names ending in digits) resolve exactly as the regexes would
+    def __init__(self, recipes, image_package_type):
+        self.recipe_dict = {}
+        for recipe in recipes:
+            self.recipe_dict.setdefault(recipe.name, []).append(recipe)
+        self.download_tail = re.compile(r".*$")
+        self.pkg_tail = re.compile(rf".*\.{image_package_type}")
+
+    @staticmethod
+    def match_version(filename, pos, version, seps):
+        # Returns position after the version separator if filename[pos:] matches v?{version}[seps], else -1
+        for start in (pos, pos + 1):
+            if start == pos + 1 and not filename.startswith('v', pos):
+                break
+            end = start + len(version)
+            if filename.startswith(version, start) and end < len(filename) and filename[end] in seps:
+                return end + 1
+        return -1
+
+    def match_download(self, filename):
+        matches = []
+        for index, char in enumerate(filename):
+            if char not in '_-':
+                continue
+            for recipe in self.recipe_dict.get(filename[:index], []):
+                pos = self.match_version(filename, index + 1, recipe.version, '.-')
+                if pos >= 0 and self.download_tail.match(filename, pos):
+                    matches.append(recipe)
+        return matches
+
+    def match_package(self, filename):
+        matches = []
+        for index, char in enumerate(filename):
+            if char not in '_-':
+                continue
+            stem = filename[:index]
+            # Recipe name may be followed by any number of digits
+            names = [stem]
+            while names[-1] and names[-1][-1].isdecimal():
+                names.append(names[-1][:-1])
+            names += [name[3:] for name in names if name.startswith('lib')]
+            for name in names:
+                for recipe in self.recipe_dict.get(name, []):
+                    pos = self.match_version(filename, index + 1, recipe.version, '+.-')
+                    if pos >= 0 and self.pkg_tail.match(filename, pos) and recipe not in matches:
+                        matches.append(recipe)
+        return matches
@@ -4,193 +4,291 @@ import requests.exceptions
 import json
 import logging
 import re
+import time
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
 from semver import Version
 
 from .RecipeClass import Recipe
+from .CacheClass import Cache
+from .OERecipeStoreClass import OERecipeStore
 # from .ConfigClass import Config
 
+oe_baseversion_pattern = re.compile(
+    r"""[vV]?0?
+        (?P<major>0|[1-9]\d*)
+        (\.0?
+        (?P<minor>0|[1-9]\d*)
+        (\.0?
+            (?P<patch>0|[1-9]\d*)
+        )?
+        )?
+    """,
+    re.VERBOSE,
+)
+
 
 class OE:
-    def __init__(self, conf: "Config"):
+    oe_api_url = "https://layers.openembedded.org/layerindex/api/"
+    oe_scoped_batch_size = 50
+    oe_scoped_workers = 4
+    oe_scoped_filter_ignored = False
+    coerce_dict = {}
+
+    def __init__(self, conf: "Config", recipe_names=None):
         logging.info(f"Processing OE recipes and layers ...")
-        self.layers = self.get_oe_layers(conf)
-        self.layerid_dict = self.process_layers()
-        self.layerbranches = self.get_oe_layerbranches(conf)
-        self.layerbranchid_dict = self.process_layerbranches()
-        self.recipes = self.get_oe_recipes(conf)
-        self.recipename_dict = self.process_recipes()
-        self.branches = self.get_oe_branches(conf)
-        self.branchid_dict = self.process_branches()
+        start_time = time.time()
+        self.layers = {}
+        self.layerid_dict = {}
+        self.layerbranches = {}
+        self.layerbranchid_dict = {}
+        self.recipe_store = OERecipeStore()
+        self.branches = {}
+        self.branchid_dict = {}
+        self.version_index_dict = {}
+        self.preferred_branches = []
+        self.preferred_layerbranches = set()
+
+        # Endpoints are fetched concurrently (shared keep-alive session) and each is processed as it arrives
+        # Recipes are returned as a store (already processed)
+        if conf.oe_recipes_scoped and recipe_names:
+            # Only fetch OE recipes with names used in this build
+            get_recipe_store = partial(self.get_oe_recipe_store_scoped, recipe_names=recipe_names)
+        else:
+            get_recipe_store = self.get_oe_recipe_store
+        fetch_list = [
+            (self.get_oe_layers, 'layers', self.process_layers, 'layerid_dict'),
+            (self.get_oe_layerbranches, 'layerbranches', self.process_layerbranches, 'layerbranchid_dict'),
+            (get_recipe_store, 'recipe_store', None, None),
+            (self.get_oe_branches, 'branches', self.process_branches, 'branchid_dict'),
+        ]
+        with requests.Session() as session:
+            session.headers.update({'Accept-Encoding': 'gzip, deflate'})
+            with ThreadPoolExecutor(max_workers=len(fetch_list)) as executor:
+                futures = {executor.submit(get_func, conf, session): (data_attr, process_func, dict_attr)
+                           for get_func, data_attr, process_func, dict_attr in fetch_list}
+                for future in as_completed(futures):
+                    data_attr, process_func, dict_attr = futures[future]
+                    setattr(self, data_attr, future.result())
+                    if process_func is not None:
+                        setattr(self, dict_attr, process_func())
+        self.set_preferred_branches(conf)
+        logging.info(f"- OE data processed in {time.time() - start_time:.1f} seconds")
 
     @staticmethod
-    def get_oe_layers(conf: "Config"):
-        logging.info("- Getting OE layers")
-        oe_data_file_exists = False
-        lfile = 'oe_layers.json'
-
-        if conf.oe_data_folder:
-            lfile = os.path.join(conf.oe_data_folder, lfile)
-            if os.path.exists(lfile):
-                oe_data_file_exists = True
-
-        if not oe_data_file_exists:
-            try:
-                url = "https://layers.openembedded.org/layerindex/api/layerItems/"
-                r = requests.get(url)
-                if r.status_code != 200:
-                    raise Exception(f"Status code {r.status_code}")
-
-                layer_dict = json.loads(r.text)
-                json_object = json.dumps(layer_dict, indent=4)
+    def get_oe_layers(conf: "Config", session=None):
+        return OE.get_oe_data(conf, 'layerItems', 'oe_layers.json', 'layers', session)
 
-                if conf.oe_data_folder:
-                    # Writing to sample.json
-                    with open(lfile, "w") as outfile:
-                        logging.info(f"- writing to file {lfile}")
-                        outfile.write(json_object)
-
-                return layer_dict
-
-            except requests.exceptions.RequestException as e:
-                logging.warning(f"Unable to connect to openembedded.org to get list of layers - error {e}")
-        else:
-            try:
-                with open(lfile, "r") as infile:
-                    logging.info(f"- loaded OE Layers from file {lfile}")
-                    return json.load(infile)
-
-            except Exception as e:
-                logging.warning(f"Error processing OE layers {e} from file - skipping")
+    @staticmethod
+    def get_oe_recipes(conf: "Config", session=None):
+        return OE.get_oe_data(conf, 'recipes', 'oe_recipes.json', 'recipes', session)
 
-        return {}
+    @staticmethod
+    def get_oe_recipe_store_scoped(conf: "Config", session=None, recipe_names=()):
+        return OE.process_recipes(OE.get_oe_recipes_scoped(conf, recipe_names, session))
 
     @staticmethod
-    def get_oe_recipes(conf: "Config"):
-        logging.info("- Getting OE recipes")
-        oe_data_file_exists = False
-        lfile = 'oe_recipes.json'
+    def get_oe_recipe_store(conf: "Config", session=None):
+        # Binary store (oe_recipes.bin) is memory-mapped instead of parsing oe_recipes.json while the JSON file
+        # is within --oe_data_ttl and unchanged since the store was written - otherwise rebuilt from the JSON
+        lfile = ''
+        bfile = ''
         if conf.oe_data_folder:
-            lfile = os.path.join(conf.oe_data_folder, lfile)
+            lfile = os.path.join(conf.oe_data_folder, 'oe_recipes.json')
+            bfile = os.path.join(conf.oe_data_folder, 'oe_recipes.bin')
             if os.path.exists(lfile):
-                oe_data_file_exists = True
-
-        if not oe_data_file_exists:
-            try:
-                url = "https://layers.openembedded.org/layerindex/api/recipes/"
-                r = requests.get(url)
-                if r.status_code != 200:
-                    raise Exception(f"Status code {r.status_code}")
+                meta = OE.load_oe_data_meta(lfile)
+                if conf.oe_data_ttl == 0 or time.time() - meta['fetched'] < conf.oe_data_ttl * 3600:
+                    recipe_store = OERecipeStore.load_binary(bfile, lfile)
+                    if recipe_store is not None:
+                        return recipe_store
 
-                recipe_dict = json.loads(r.text)
-                json_object = json.dumps(recipe_dict, indent=4)
-
-                if conf.oe_data_folder:
-                    # Writing to sample.json
-                    with open(lfile, "w") as outfile:
-                        logging.info(f"- writing to file {lfile}")
-                        outfile.write(json_object)
-
-                return recipe_dict
-
-            except requests.exceptions.RequestException as e:
-                logging.warning(f"Unable to connect to openembedded.org to get list of recipes - error {e}")
-        else:
-            try:
-                with open(lfile, "r") as infile:
-                    logging.info(f"- loaded OE Recipes from file {lfile}")
-                    recipe_dict = json.load(infile)
-                return recipe_dict
-
-            except Exception as e:
-                logging.warning(f"Error processing OE recipes from file {e} - skipping")
-
-        return {}
+        recipe_store = OE.process_recipes(OE.get_oe_recipes(conf, session))
+        if bfile and os.path.exists(lfile) and recipe_store.count() > 0:
+            recipe_store.save_binary(bfile, lfile)
+        return recipe_store
 
     @staticmethod
-    def get_oe_layerbranches(conf: "Config"):
-        logging.info("- Getting OE layerbranches")
-
-        oe_data_file_exists = False
-        lfile = 'oe_layerbranches.json'
+    def get_oe_recipes_scoped(conf: "Config", recipe_names, session=None):
+        # Query recipes API filtered by recipe name (batches of names fetched concurrently)
+        # Results are cached per recipe name in --oe_data_folder and refetched after --oe_data_ttl hours
+        recipe_names = set(recipe_names)
+        logging.info(f"- Getting OE recipes for {len(recipe_names)} build recipe names")
+        start_time = time.time()
+        cfile = ''
+        cache = {'fetched': {}, 'recipes': {}}
         if conf.oe_data_folder:
-            lfile = os.path.join(conf.oe_data_folder, lfile)
-            if os.path.exists(lfile):
-                oe_data_file_exists = True
-
-        if not oe_data_file_exists:
-            try:
-                url = "https://layers.openembedded.org/layerindex/api/layerBranches/"
-                r = requests.get(url)
-                if r.status_code != 200:
-                    raise Exception(f"Status code {r.status_code}")
-
-                layerbranches_dict = json.loads(r.text)
-                json_object = json.dumps(layerbranches_dict, indent=4)
-
-                if conf.oe_data_folder:
-                    # Writing to sample.json
-                    with open(lfile, "w") as outfile:
-                        logging.info(f"- writing to file {lfile}")
-                        outfile.write(json_object)
+            cfile = os.path.join(conf.oe_data_folder, 'oe_recipes_scoped.json')
+            data = Cache.load_json(cfile)
+            if data is not None and 'fetched' in data and 'recipes' in data:
+                cache = data
+
+        now = time.time()
+        names = []
+        for name in sorted(recipe_names):
+            fetched = cache['fetched'].get(name)
+            if fetched is None or (conf.oe_data_ttl != 0 and now - fetched >= conf.oe_data_ttl * 3600):
+                names.append(name)
+        logging.info(f"- {len(recipe_names) - len(names)} recipe names from cache - fetching {len(names)}")
+
+        batches = [names[i:i + OE.oe_scoped_batch_size] for i in range(0, len(names), OE.oe_scoped_batch_size)]
+        if len(batches) > 0:
+            # First batch is fetched on its own to check the server applies the name filter (otherwise every batch
+            # would download all OE recipes)
+            results = [OE.get_oe_recipes_batch(batches[0], session)]
+            if results[0] is not None and len(batches) > 1:
+                with ThreadPoolExecutor(max_workers=min(OE.oe_scoped_workers, len(batches) - 1)) as executor:
+                    results += list(executor.map(lambda batch: OE.get_oe_recipes_batch(batch, session), batches[1:]))
+            if None in results:
+                logging.warning("Unable to get OE recipes filtered by recipe name - getting all OE recipes")
+                return OE.get_oe_recipes(conf, session)
+
+            for batch, batch_recipes in zip(batches, results):
+                for name in batch:
+                    cache['fetched'][name] = now
+                    cache['recipes'][name] = []
+                for oe_recipe in batch_recipes:
+                    cache['recipes'].setdefault(oe_recipe['pn'], []).append(oe_recipe)
+            Cache.save_json(cfile, cache)
+
+        recipes = []
+        for name in recipe_names:
+            recipes += cache['recipes'].get(name, [])
+        logging.info(f"- Got {len(recipes)} OE recipes in {time.time() - start_time:.1f} seconds")
+        return recipes
 
-                return layerbranches_dict
-
-            except requests.exceptions.RequestException as e:
-                logging.warning(f"Unable to connect to openembedded.org to get list of layerbranches - error {e}")
-        else:
-            try:
-                with open(lfile, "r") as infile:
-                    logging.info(f"- loaded OE LayerBranches from file {lfile}")
-                    layerbranches_dict = json.load(infile)
-                return layerbranches_dict
-
-            except Exception as e:
-                logging.warning(f"Error processing OE layerbranches from file {e} - skipping")
+    @staticmethod
+    def get_oe_recipes_batch(names, session=None):
+        # Layerindex API filter is 'field:value' - regex lookup used to match a list of names
+        name_regex = '^(' + '|'.join(re.escape(name) for name in names) + ')$'
+        try:
+            url = f"{OE.oe_api_url}recipes/"
+            params = {'filter': f"pn__regex:{name_regex}"}
+            if session is None:
+                r = requests.get(url, params=params)
+            else:
+                r = session.get(url, params=params)
+            if r.status_code != 200:
+                raise requests.exceptions.RequestException(f"Status code {r.status_code}")
+            oe_recipes = json.loads(r.content)
+            other_names = {oe_recipe['pn'] for oe_recipe in oe_recipes} - set(names)
+            if other_names:
+                # Server ignored the filter (returned recipes which were not requested)
+                if not OE.oe_scoped_filter_ignored:
+                    OE.oe_scoped_filter_ignored = True
+                    logging.warning(f"OE layerindex server did not apply recipe name filter ({len(oe_recipes)} "
+                                    f"recipes returned including {len(other_names)} names not requested)")
+                return None
+            return oe_recipes
+
+        except (requests.exceptions.RequestException, ValueError, KeyError, TypeError) as e:
+            logging.warning(f"Unable to get OE recipes {names[0]}...{names[-1]} - error {e}")
+        return None
 
-        return {}
+    @staticmethod
+    def get_oe_layerbranches(conf: "Config", session=None):
+        return OE.get_oe_data(conf, 'layerBranches', 'oe_layerbranches.json', 'layerbranches', session)
 
     @staticmethod
-    def get_oe_branches(conf: "Config"):
-        logging.info("- Getting OE branches")
+    def get_oe_branches(conf: "Config", session=None):
+        return OE.get_oe_data(conf, 'branches', 'oe_branches.json', 'branches', session)
 
-        oe_data_file_exists = False
-        lfile = 'oe_branches.json'
+    @staticmethod
+    def get_oe_data(conf: "Config", endpoint, filename, label, session=None):
+        # Data files in --oe_data_folder are revalidated against the server (using ETag/Last-Modified) once
+        # older than --oe_data_ttl hours - stale file is used if the server cannot be reached
+        logging.info(f"- Getting OE {label}")
+        lfile = ''
+        meta = {}
         if conf.oe_data_folder:
-            lfile = os.path.join(conf.oe_data_folder, lfile)
+            lfile = os.path.join(conf.oe_data_folder, filename)
             if os.path.exists(lfile):
-                oe_data_file_exists = True
+                meta = OE.load_oe_data_meta(lfile)
+                age = time.time() - meta['fetched']
+                if conf.oe_data_ttl == 0 or age < conf.oe_data_ttl * 3600:
+                    return OE.load_oe_data_file(lfile, label)
+                logging.info(f"- OE {label} file {lfile} is {age / 3600:.0f} hours old - checking for update")
 
-        if not oe_data_file_exists:
-            try:
-                url = "https://layers.openembedded.org/layerindex/api/branches/"
-                r = requests.get(url)
-                if r.status_code != 200:
-                    raise Exception(f"Status code {r.status_code}")
+        try:
+            headers = {}
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+            url = f"{OE.oe_api_url}{endpoint}/"
+            if session is None:
+                r = requests.get(url, headers=headers)
+            else:
+                r = session.get(url, headers=headers)
+            if r.status_code == 304:
+                logging.info(f"- OE {label} unchanged on server")
+                meta['fetched'] = time.time()
+                OE.save_oe_data_meta(lfile, meta)
+                return OE.load_oe_data_file(lfile, label)
+            if r.status_code != 200:
+                raise requests.exceptions.RequestException(f"Status code {r.status_code}")
+
+            data = json.loads(r.content)
+
+            if lfile:
+                logging.info(f"- writing to file {lfile}")
+                with open(lfile + '.tmp', "wb") as outfile:
+                    outfile.write(r.content)
+                os.replace(lfile + '.tmp', lfile)
+                OE.save_oe_data_meta(lfile, {
+                    'fetched': time.time(),
+                    'etag': r.headers.get('ETag', ''),
+                    'last_modified': r.headers.get('Last-Modified', ''),
+                })
+
+            return data
+
+        except requests.exceptions.RequestException as e:
+            logging.warning(f"Unable to connect to openembedded.org to get list of {label} - error {e}")
+            if lfile and os.path.exists(lfile):
+                logging.warning(f"- using stale OE {label} file {lfile}")
+                return OE.load_oe_data_file(lfile, label)
 
-                branches_dict = json.loads(r.text)
-                json_object = json.dumps(branches_dict, indent=4)
+        return {}
 
-                if conf.oe_data_folder:
-                    # Writing to sample.json
-                    with open(lfile, "w") as outfile:
-                        logging.info(f"- writing to file {lfile}")
-                        outfile.write(json_object)
+    @staticmethod
+    def get_oe_data_fingerprint(conf: "Config"):
+        # Changes whenever a data file in --oe_data_folder is downloaded again (empty if no folder)
+        if not conf.oe_data_folder:
+            return ''
+        values = []
+        for filename in ['oe_layers.json', 'oe_recipes.json', 'oe_recipes_scoped.json', 'oe_layerbranches.json',
+                         'oe_branches.json']:
+            lfile = os.path.join(conf.oe_data_folder, filename)
+            if os.path.isfile(lfile):
+                st = os.stat(lfile)
+                values += [filename, st.st_size, st.st_mtime_ns]
+        return Cache.fingerprint(values)
 
-                return branches_dict
+    @staticmethod
+    def load_oe_data_file(lfile, label):
+        try:
+            with open(lfile, "r") as infile:
+                logging.info(f"- loaded OE {label} from file {lfile}")
+                return json.load(infile)
 
-            except requests.exceptions.RequestException as e:
-                logging.warning(f"Unable to connect to openembedded.org to get list of branches - error {e}")
-        else:
-            try:
-                with open(lfile, "r") as infile:
-                    logging.info(f"- loaded OE Branches from file {lfile}")
-                    layerbranches_dict = json.load(infile)
-                return layerbranches_dict
+        except Exception as e:
+            logging.warning(f"Error processing OE {label} from file {e} - skipping")
+        return {}
 
-            except Exception as e:
-                logging.warning(f"Error processing OE branches from file {e} - skipping")
+    @staticmethod
+    def load_oe_data_meta(lfile):
+        # Files without metadata (written by earlier versions) are aged by modification time
+        meta = Cache.load_json(lfile + '.meta')
+        if meta is None or 'fetched' not in meta:
+            meta = {'fetched': os.path.getmtime(lfile)}
+        return meta
 
-        return {}
+    @staticmethod
+    def save_oe_data_meta(lfile, meta):
+        if lfile:
+            Cache.save_json(lfile + '.meta', meta)
 
     def process_layers(self):
         try:
@@ -203,18 +301,17 @@ class OE:
 
         return {}
 
-    def process_recipes(self):
+    @staticmethod
+    def process_recipes(recipes):
+        # Recipes are moved into columnar store (layerindex dicts are not retained)
+        recipe_store = OERecipeStore()
         try:
-            recipe_dict = {}
-            for recipe in self.recipes:
-                if recipe['pn'] in recipe_dict.keys():
-                    recipe_dict[recipe['pn']].append(recipe)
-                else:
-                    recipe_dict[recipe['pn']] = [recipe]
-            return recipe_dict
+            for recipe in recipes:
+                recipe_store.add_recipe(recipe)
         except Exception as e:
             logging.warning(f"Cannot process recipe {e}")
-        return {}
+        logging.debug(f"OE recipe store - {recipe_store.count()} recipes, {recipe_store.count_strings()} strings")
+        return recipe_store
 
     def process_layerbranches(self):
         try:
@@ -237,6 +334,34 @@ class OE:
 
         return {}
 
+    def set_preferred_branches(self, conf: "Config"):
+        # OE release branch of the build (--oe_branch or LAYERSERIES_CORENAMES/DISTRO_CODENAME from bitbake -e)
+        # plus neighbouring branches (by sort priority) - near version matches are searched in these first
+        if conf.oe_branch:
+            build_names = [conf.oe_branch]
+        elif conf.layerseries_corenames:
+            build_names = conf.layerseries_corenames.split()
+        else:
+            build_names = conf.distro_codename.split()
+        build_names = [name.lower() for name in build_names]
+        if not build_names or build_names == ['all']:
+            return
+
+        branches = sorted(self.branchid_dict.values(),
+                          key=lambda branch: (int(self.get_branch_priority(branch)), branch['id']))
+        positions = [pos for pos, branch in enumerate(branches) if str(branch.get('name', '')).lower() in build_names]
+        if not positions:
+            logging.info(f"- Build release branch '{' '.join(build_names)}' not found in OE branches - "
+                         f"searching all OE branches")
+            return
+        branch_ids = set()
+        for pos in positions:
+            branch_ids.update(branch['id'] for branch in branches[max(pos - 1, 0):pos + 2])
+        self.preferred_branches = sorted(str(self.branchid_dict[branchid].get('name', '')) for branchid in branch_ids)
+        self.preferred_layerbranches = {layerbranchid for layerbranchid, layerbranch in self.layerbranchid_dict.items()
+                                        if layerbranch.get('branch') in branch_ids}
+        logging.info(f"- Searching OE branches {', '.join(self.preferred_branches)} first for close version matches")
+
     def get_layer_by_layerbranchid(self, layerid):
         try:
             layerid = self.layerbranchid_dict[layerid]['layer']
@@ -353,7 +478,7 @@ class OE:
             exact_layer = False
 
             recipename_in_oe = False
-            if recipe.name in self.recipename_dict.keys():
+            if self.recipe_store.has_name(recipe.name):
                 if recipe.epoch:
                     recipe_ver = f"{recipe.epoch}:{recipe.version}"
                 else:
@@ -363,11 +488,12 @@ class OE:
                 meta_layer_found = False
                 recipe_match = False
                 best_layer = None
-                for oe_recipe in self.recipename_dict[recipe.name]:
-                    if oe_recipe['pe']:
-                        oe_ver = f"{oe_recipe['pe']}:{oe_recipe['pv']}"
+                for row in self.recipe_store.get_rows(recipe.name):
+                    oe_pe = self.recipe_store.get_pe(row)
+                    if oe_pe:
+                        oe_ver = f"{oe_pe}:{self.recipe_store.get_pv(row)}"
                     else:
-                        oe_ver = oe_recipe['pv']
+                        oe_ver = self.recipe_store.get_pv(row)
 
                     if recipe_ver == oe_ver:
                         #Exact match
@@ -376,15 +502,15 @@ class OE:
                         exact_ver = True
                         exact_layer = True
 
-                        this_layer = self.get_layer_by_layerbranchid(oe_recipe['layerbranch'])
+                        this_layer = self.get_layer_by_layerbranchid(self.recipe_store.get_layerbranch(row))
                         if this_layer['name'] == 'openembedded-core' or this_layer['name'] == 'meta':
                             meta_layer_found = True
                             best_layer = this_layer
-                            best_recipe = oe_recipe
+                            best_recipe = self.recipe_store.get_recipe(row)
                             recipe_match = True
                         elif not meta_layer_found:
                             best_layer = this_layer
-                            best_recipe = oe_recipe
+                            best_recipe = self.recipe_store.get_recipe(row)
                             recipe_match = True
 
                 if recipe_match:
@@ -398,23 +524,27 @@ class OE:
                     logging.debug(f"Recipe {recipe.name}: {recipe.layer}/{recipe.name}/{recipe_ver} - No OE exact match")
                     return {}, {}, False, False
 
-                for oe_recipe in self.recipename_dict[recipe.name]:
-                    # if oe_recipe['pe']:
-                    #     oe_ver = f"{oe_recipe['pe']}:{oe_recipe['pv']}"
-                    # else:
-                    #     oe_ver = oe_recipe['pv']
+                for candidates in self.get_candidate_recipes(conf, recipe):
+                    for oe_recipe in candidates:
+                        # if oe_recipe['pe']:
+                        #     oe_ver = f"{oe_recipe['pe']}:{oe_recipe['pv']}"
+                        # else:
+                        #     oe_ver = oe_recipe['pv']
 
-                    # Check version distance
-                    match, exact_ver_temp = self.compare_recipes(conf, recipe, oe_recipe, best_recipe)
-                    if match:
-                        best_recipe = oe_recipe
-                        recipe.matched_oe = True
-                        if exact_ver_temp:
-                            exact_ver = True
-                            recipe.matched_oe_exact = True
-                            break
-                    else:
-                        recipename_in_oe = True
+                        # Check version distance
+                        match, exact_ver_temp = self.compare_recipes(conf, recipe, oe_recipe, best_recipe)
+                        if match:
+                            best_recipe = oe_recipe
+                            recipe.matched_oe = True
+                            if exact_ver_temp:
+                                exact_ver = True
+                                recipe.matched_oe_exact = True
+                                break
+                        else:
+                            recipename_in_oe = True
+                    if best_recipe != {}:
+                        # Other branches only searched if no near match in preferred branches
+                        break
 
                 if not recipe.matched_oe and recipename_in_oe:
                     recipe.recipename_in_oe = True
@@ -442,8 +572,79 @@ class OE:
             logging.warning(f"Error getting nearest OE recipe - {e}")
         return {}, {}, False, False
 
+    def get_version_index(self, pn):
+        # Per-PN index of OE recipe versions (built on first use):
+        # - ver_dict - filtered version string: rows
+        # - versions/keys/rows - semver versions in sorted order with (major, minor, patch) and store row
+        index = self.version_index_dict.get(pn)
+        if index is None:
+            ver_dict = {}
+            semver_rows = []
+            for row in self.recipe_store.get_rows(pn):
+                oe_ver = Recipe.filter_version_string(self.recipe_store.get_pv(row))
+                ver_dict.setdefault(oe_ver, []).append(row)
+                oe_semver, oe_rest = self.coerce_version(oe_ver)
+                if oe_semver is not None:
+                    semver_rows.append((oe_semver, row))
+            semver_rows.sort(key=lambda entry: entry[0])
+            index = {
+                'ver_dict': ver_dict,
+                'versions': [entry[0] for entry in semver_rows],
+                'keys': [(entry[0].major, entry[0].minor, entry[0].patch) for entry in semver_rows],
+                'rows': [entry[1] for entry in semver_rows],
+            }
+            self.version_index_dict[pn] = index
+        return index
+
+    def get_candidate_recipes(self, conf: "Config", recipe: Recipe):
+        # OE recipes which compare_recipes() can match (in original order) - same version string or a
+        # lower semver version within max_oe_version_distance (found by binary search)
+        # Other recipes can never be preferred so skipping them does not change the result
+        # Returned as list of candidate lists - recipes in preferred branches (if any) then other recipes, unless
+        # a recipe in any branch is an exact version match for compare_recipes() (which must always be preferred
+        # over a near match)
+        index = self.get_version_index(recipe.name)
+        exact_rows = index['ver_dict'].get(recipe.version, [])
+        rows = set(exact_rows)
+        semver, rest = self.coerce_version(recipe.version)
+        if semver is not None:
+            distance = conf.max_oe_version_distance
+            low = None
+            if distance[0] > 0:
+                low = (semver.major - distance[0],)
+            elif distance[1] > 0:
+                low = (semver.major, semver.minor - distance[1])
+            elif distance[2] > 0:
+                low = (semver.major, semver.minor, semver.patch - distance[2])
+            if low is not None:
+                start = bisect_left(index['keys'], low)
+                end = bisect_right(index['versions'], semver)
+                rows.update(index['rows'][start:end])
+
+        # Store rows for a recipe name are in original order
+        rows = sorted(rows)
+        if not self.preferred_layerbranches or exact_rows:
+            return [[self.recipe_store.get_recipe(row) for row in rows]]
+        preferred = []
+        other = []
+        for row in rows:
+            if self.recipe_store.layerbranch[row] in self.preferred_layerbranches:
+                preferred.append(self.recipe_store.get_recipe(row))
+            else:
+                other.append(self.recipe_store.get_recipe(row))
+        return [preferred, other]
+
     @staticmethod
     def coerce_version(version: str):
+        # Results memoized - each version string is only parsed once
+        ret = OE.coerce_dict.get(version)
+        if ret is None:
+            ret = OE.parse_coerce_version(version)
+            OE.coerce_dict[version] = ret
+        return ret
+
+    @staticmethod
+    def parse_coerce_version(version: str):
         if not version:
             return None, ''
 
@@ -464,20 +665,7 @@ class OE:
             belong to a basic version.
         :rtype: tuple(:class:`Version` | None, str)
         """
-        baseversion = re.compile(
-            r"""[vV]?0?
-                (?P<major>0|[1-9]\d*)
-                (\.0?
-                (?P<minor>0|[1-9]\d*)
-                (\.0?
-                    (?P<patch>0|[1-9]\d*)
-                )?
-                )?
-            """,
-            re.VERBOSE,
-        )
-
-        match = baseversion.search(version)
+        match = oe_baseversion_pattern.search(version)
         if not match:
             return None, version
 
@@ -0,0 +1,83 @@
+import json
+import logging
+
+from .CacheClass import Cache
+from .OEClass import OE
+
+
+class OEMatchCache:
+    # Records OE match results per recipe between runs (in --cache_dir) - entries are cleared when the OE data
+    # files in --oe_data_folder are downloaded again
+    # matches - key: [oe recipe id, oe layer id, exact_ver, exact_layer, matched_oe, matched_oe_exact,
+    #                 recipename_in_oe] (ids are None if no OE match)
+    cache_version = 2
+
+    def __init__(self, conf: "Config", oe):
+        self.conf = conf
+        self.oe = oe
+        self.cfile = ''
+        self.fingerprint = ''
+        self.matches = {}
+        self.hits = 0
+        self.changed = False
+
+        if conf.oe_data_folder:
+            self.cfile = Cache.get_path(conf, 'oe_match_cache.json')
+        if not self.cfile:
+            return
+        self.fingerprint = Cache.fingerprint([self.cache_version, OE.get_oe_data_fingerprint(conf)])
+        data = Cache.load_json(self.cfile)
+        if data is not None and 'matches' in data:
+            if data.get('fingerprint') == self.fingerprint:
+                self.matches = data['matches']
+            else:
+                logging.info("- OE data changed since previous run - clearing cached OE recipe matches")
+                self.changed = True
+
+    def enabled(self):
+        return self.cfile != ''
+
+    def get_key(self, recipe):
+        return json.dumps([recipe.name, recipe.epoch, recipe.version, recipe.layer,
+                           self.conf.max_oe_version_distance, self.oe.preferred_branches])
+
+    def get_result(self, recipe):
+        # Returns OE match result as from RecipeList.match_recipe_oe() (None if not cached)
+        if not self.enabled():
+            return None
+        entry = self.matches.get(self.get_key(recipe))
+        if entry is None:
+            return None
+        oe_id, layer_id, exact_ver, exact_layer, matched_oe, matched_oe_exact, recipename_in_oe = entry
+        oe_recipe = {}
+        oe_layer = {}
+        if oe_id is not None:
+            row = self.oe.recipe_store.find_row(recipe.name, oe_id)
+            if row < 0:
+                return None
+            oe_recipe = self.oe.recipe_store.get_recipe(row)
+            oe_layer = self.oe.get_layer_by_layerbranchid(oe_recipe['layerbranch'])
+            if oe_layer.get('id') != layer_id:
+                return None
+        self.hits += 1
+        return oe_recipe, oe_layer, exact_ver, exact_layer, matched_oe, matched_oe_exact, recipename_in_oe
+
+    def add_result(self, recipe, result):
+        if not self.enabled():
+            return
+        oe_recipe, oe_layer, exact_ver, exact_layer, matched_oe, matched_oe_exact, recipename_in_oe = result
+        oe_id = None
+        layer_id = None
+        if oe_recipe != {}:
+            # Matches can only be cached if the OE recipe can be found again by id
+            if oe_recipe.get('id') is None:
+                return
+            oe_id = oe_recipe['id']
+            layer_id = oe_layer.get('id')
+        self.matches[self.get_key(recipe)] = [oe_id, layer_id, exact_ver, exact_layer, matched_oe,
+                                              matched_oe_exact, recipename_in_oe]
+        self.changed = True
+
+    def save(self):
+        if self.enabled() and self.changed:
+            Cache.save_json(self.cfile, {'fingerprint': self.fingerprint, 'matches': self.matches})
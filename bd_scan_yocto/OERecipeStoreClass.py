@@ -0,0 +1,220 @@
+import os
+import sys
+import mmap
+import struct
+import logging
+from array import array
+
+# Binary store file - header followed by int64 columns and string table (mapped read-only at load)
+# magic, little-endian flag, rows, strings, string data bytes, names, source file size, source file mtime_ns
+oe_store_magic = b'BDOESTR1'
+oe_store_header = struct.Struct('<8sqqqqqqq')
+
+
+class OERecipeStore:
+    # Columnar store of OE layerindex recipes addressed by integer row id
+    # String columns hold ids into an interned string table (-1 = None) so repeated values are stored once
+    def __init__(self):
+        self.strings = []
+        self.string_ids = {}
+        self.ids = array('l')
+        self.pn = array('l')
+        self.pv = array('l')
+        self.pr = array('l')
+        self.pe = array('l')
+        self.layerbranch = array('l')
+        self.name_rows = {}
+        # Binary (memory-mapped) store only
+        self.string_offsets = None
+        self.string_data = None
+        self.string_cache = {}
+        self.mm = None
+
+    def intern(self, value):
+        if value is None:
+            return -1
+        strid = self.string_ids.get(value)
+        if strid is None:
+            strid = len(self.strings)
+            self.strings.append(value)
+            self.string_ids[value] = strid
+        return strid
+
+    def get_string(self, strid):
+        if strid < 0:
+            return None
+        if self.string_offsets is None:
+            return self.strings[strid]
+        value = self.string_cache.get(strid)
+        if value is None:
+            value = bytes(self.string_data[self.string_offsets[strid]:self.string_offsets[strid + 1]]).decode('utf-8')
+            self.string_cache[strid] = value
+        return value
+
+    def count_strings(self):
+        if self.string_offsets is None:
+            return len(self.strings)
+        return len(self.string_offsets) - 1
+
+    def add_recipe(self, oe_recipe):
+        row = len(self.pn)
+        oeid = oe_recipe.get('id')
+        layerbranch = oe_recipe.get('layerbranch')
+        self.ids.append(oeid if isinstance(oeid, int) else -1)
+        self.pn.append(self.intern(oe_recipe['pn']))
+        self.pv.append(self.intern(oe_recipe.get('pv')))
+        self.pr.append(self.intern(oe_recipe.get('pr')))
+        self.pe.append(self.intern(oe_recipe.get('pe')))
+        self.layerbranch.append(layerbranch if isinstance(layerbranch, int) else -1)
+        if oe_recipe['pn'] in self.name_rows:
+            self.name_rows[oe_recipe['pn']].append(row)
+        else:
+            self.name_rows[oe_recipe['pn']] = array('l', [row])
+        return row
+
+    def count(self):
+        return len(self.pn)
+
+    def has_name(self, pn):
+        return pn in self.name_rows
+
+    def get_rows(self, pn):
+        # Rows for recipe name in original order
+        return self.name_rows.get(pn, ())
+
+    def find_row(self, pn, oeid):
+        # Row of recipe with layerindex id (-1 if not found)
+        for row in self.get_rows(pn):
+            if self.ids[row] == oeid:
+                return row
+        return -1
+
+    def get_pv(self, row):
+        return self.get_string(self.pv[row])
+
+    def get_pe(self, row):
+        return self.get_string(self.pe[row])
+
+    def get_layerbranch(self, row):
+        if self.layerbranch[row] < 0:
+            return None
+        return self.layerbranch[row]
+
+    def get_recipe(self, row):
+        # Materialize row as dict with the layerindex recipe fields used for matching and SBOM output
+        return {
+            'id': self.ids[row] if self.ids[row] >= 0 else None,
+            'pn': self.get_string(self.pn[row]),
+            'pv': self.get_pv(row),
+            'pr': self.get_string(self.pr[row]),
+            'pe': self.get_pe(row),
+            'layerbranch': self.get_layerbranch(row),
+        }
+
+    def save_binary(self, bfile, source_file=''):
+        # Rows are written grouped by recipe name (original order within name) so each name is a row range
+        # Source file size/mtime are recorded so the binary store is only used while the source is unchanged
+        try:
+            order = array('q')
+            name_strid = array('q')
+            name_start = array('q')
+            name_end = array('q')
+            for pn, rows in self.name_rows.items():
+                name_strid.append(self.string_ids[pn])
+                name_start.append(len(order))
+                order.fromlist(rows.tolist())
+                name_end.append(len(order))
+
+            string_offsets = array('q', [0])
+            encoded = []
+            for value in self.strings:
+                encoded.append(value.encode('utf-8'))
+                string_offsets.append(string_offsets[-1] + len(encoded[-1]))
+
+            src_size, src_mtime = 0, 0
+            if source_file:
+                st = os.stat(source_file)
+                src_size, src_mtime = st.st_size, st.st_mtime_ns
+
+            with open(bfile + '.tmp', 'wb') as outfile:
+                outfile.write(oe_store_header.pack(oe_store_magic, int(sys.byteorder == 'little'), len(order),
+                                                   len(self.strings), string_offsets[-1], len(name_strid),
+                                                   src_size, src_mtime))
+                string_offsets.tofile(outfile)
+                for column in (self.ids, self.pn, self.pv, self.pr, self.pe, self.layerbranch):
+                    array('q', (column[row] for row in order)).tofile(outfile)
+                for column in (name_strid, name_start, name_end):
+                    column.tofile(outfile)
+                outfile.write(b''.join(encoded))
+            os.replace(bfile + '.tmp', bfile)
+            logging.info(f"- written OE recipe store {bfile}")
+            return True
+
+        except OSError as e:
+            logging.warning(f"Unable to write OE recipe store {bfile} - {e}")
+        return False
+
+    @staticmethod
+    def load_binary(bfile, source_file=''):
+        # Returns memory-mapped store (or None if file missing, invalid or older than source file)
+        if not os.path.isfile(bfile):
+            return None
+        mm = None
+        views = []
+        store = None
+        try:
+            with open(bfile, 'rb') as infile:
+                mm = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+            (magic, little_endian, nrows, nstrings, data_len, nnames,
+             src_size, src_mtime) = oe_store_header.unpack_from(mm, 0)
+            if magic != oe_store_magic or little_endian != int(sys.byteorder == 'little'):
+                logging.warning(f"OE recipe store {bfile} has invalid format - ignoring")
+                return None
+            if source_file:
+                st = os.stat(source_file)
+                if st.st_size != src_size or st.st_mtime_ns != src_mtime:
+                    logging.info(f"- OE recipe store {bfile} is out of date")
+                    return None
+
+            counts = [nstrings + 1] + [nrows] * 6 + [nnames] * 3
+            if min(counts + [data_len]) < 0 or oe_store_header.size + 8 * sum(counts) + data_len != len(mm):
+                logging.warning(f"OE recipe store {bfile} is truncated - ignoring")
+                return None
+            views.append(memoryview(mm))
+            pos = oe_store_header.size
+            columns = []
+            for count in counts:
+                views.append(views[0][pos:pos + 8 * count])
+                views.append(views[-1].cast('q'))
+                columns.append(views[-1])
+                pos += 8 * count
+            string_offsets = columns[0]
+            name_strid, name_start, name_end = columns[7:10]
+            if string_offsets[0] != 0 or string_offsets[nstrings] != data_len or \
+                    any(not 0 <= name_strid[index] < nstrings or not 0 <= name_start[index] <= name_end[index] <= nrows
+                        for index in range(nnames)):
+                logging.warning(f"OE recipe store {bfile} has invalid format - ignoring")
+                return None
+            views.append(views[0][pos:pos + data_len])
+
+            loaded = OERecipeStore()
+            loaded.mm = mm
+            loaded.string_offsets = string_offsets
+            loaded.ids, loaded.pn, loaded.pv, loaded.pr, loaded.pe, loaded.layerbranch = columns[1:7]
+            loaded.string_data = views[-1]
+            for index in range(nnames):
+                loaded.name_rows[loaded.get_string(name_strid[index])] = range(name_start[index], name_end[index])
+            logging.info(f"- loaded OE recipe store {bfile} ({nrows} recipes)")
+            store = loaded
+            return store
+
+        except (OSError, ValueError, struct.error) as e:
+            logging.warning(f"Unable to load OE recipe store {bfile} - {e}")
+        finally:
+            if store is None:
+                # Views must be released before the map can be closed
+                for view in reversed(views):
+                    view.release()
+                if mm is not None:
+                    mm.close()
+        return None
@@ -1,20 +1,39 @@
 import os.path
-import re
 import logging
+import math
+import multiprocessing
+import shlex
 import shutil
 import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 from .RecipeClass import Recipe
 from .BBClass import BB
+from .FileMatcherClass import FileMatcher
 # from .BOMClass import BOM
 # from .ConfigClass import Config
 from .SBOMClass import SBOM
+from .ScanCacheClass import ScanCache
+from .OEMatchCacheClass import OEMatchCache
+
+# Linux ioctl to clone file extents (copy-on-write) - _IOW(0x94, 9, int)
+FICLONE = 0x40049409
 
 
 class RecipeList:
+    # OE data and recipes inherited by forked OE match worker processes
+    oe_match_state = None
+
     def __init__(self):
         self.recipes = []
         self.unmatched = 0
+        # Index over self.recipes - recipe name is unique within the list
+        self.recipe_dict = {}
 
     def count(self):
         return len(self.recipes)
@@ -26,50 +45,67 @@ class RecipeList:
                 count_nolayer += 1
         return count_nolayer
 
+    def add_recipe(self, recipe: Recipe):
+        if recipe.name in self.recipe_dict:
+            return False
+        self.recipes.append(recipe)
+        self.recipe_dict[recipe.name] = recipe
+        return True
+
+    def get_recipe(self, recipe_name):
+        return self.recipe_dict.get(recipe_name)
+
     def check_recipe_exists(self, recipe_name):
-        for recipe in self.recipes:
-            if recipe.name == recipe_name:
-                return True
-        return False
+        return recipe_name in self.recipe_dict
 
     def add_layer_to_recipe(self, rec, layer, ver):
+        recipe = self.recipe_dict.get(rec)
+        if recipe is None:
+            return
         epoch, version = Recipe.get_epoch_and_version(ver)
-        for recipe in self.recipes:
-            if recipe.name == rec:
-                if recipe.version != '':
-                    if recipe.version == version:
-                        recipe.add_layer(layer)
-                        recipe.epoch = epoch
-                else:
-                    recipe.add_layer(layer)
-                    recipe.epoch = epoch
-                    recipe.version = version
+        if recipe.version != '':
+            if recipe.version != version:
                 return
+        else:
+            recipe.version = version
+        recipe.add_layer(layer)
+        recipe.epoch = epoch
 
     def add_rel_to_recipe(self, rec, rel):
-        for recipe in self.recipes:
-            if recipe.name == rec:
-                recipe.release = rel
-                return
+        recipe = self.recipe_dict.get(rec)
+        if recipe is not None:
+            recipe.release = rel
 
     def print_recipes(self):
         for recipe in self.recipes:
             recipe.print_recipe()
 
-    def get_layers(self):
-        layers = []
-        for recipe in self.recipes:
-            if recipe.layer not in layers:
-                layers.append(recipe.layer)
-        return layers
-
     def check_recipes_in_oe(self, conf: "Config", oe):
         recipes_in_oe = 0
         exact_recipes_in_oe = 0
         changed_layers = 0
         exact_layers = 0
-        for recipe in self.recipes:
-            recipe.oe_recipe, recipe.oe_layer, exact_ver, exact_layer = oe.get_recipe(conf, recipe)
+        # Only recipes without a cached match result from a previous run (with the same OE data) are matched
+        match_cache = OEMatchCache(conf, oe)
+        results = [match_cache.get_result(recipe) for recipe in self.recipes]
+        indexes = [index for index, result in enumerate(results) if result is None]
+        if match_cache.enabled():
+            logging.info(f"- {match_cache.hits} recipe OE matches from cache - matching {len(indexes)} recipes")
+
+        new_results = None
+        if conf.oe_match_workers > 1 and len(indexes) > 1:
+            new_results = self.match_recipes_oe_parallel(conf, oe, indexes)
+        if new_results is None:
+            new_results = [self.match_recipe_oe(conf, oe, self.recipes[index]) for index in indexes]
+        for index, result in zip(indexes, new_results):
+            results[index] = result
+            match_cache.add_result(self.recipes[index], result)
+        match_cache.save()
+
+        # Results are applied in recipe order so counts (and recipe data) are identical to serial matching
+        for recipe, result in zip(self.recipes, results):
+            (recipe.oe_recipe, recipe.oe_layer, exact_ver, exact_layer,
+             recipe.matched_oe, recipe.matched_oe_exact, recipe.recipename_in_oe) = result
             if recipe.oe_recipe != {}:
                 recipes_in_oe += 1
                 if not exact_layer:
@@ -92,50 +128,181 @@ class RecipeList:
         logging.info(f"    - {changed_layers} exist in different OE layer (mapped to original)")
         logging.info(f"- ({self.count() - recipes_in_oe} Other Recipes)")
 
+    @staticmethod
+    def match_recipe_oe(conf: "Config", oe, recipe):
+        # OE match result including the match flags set on the recipe by get_recipe()
+        oe_recipe, oe_layer, exact_ver, exact_layer = oe.get_recipe(conf, recipe)
+        return (oe_recipe, oe_layer, exact_ver, exact_layer,
+                recipe.matched_oe, recipe.matched_oe_exact, recipe.recipename_in_oe)
+
+    @staticmethod
+    def match_recipes_oe_chunk(indexes):
+        # Runs in forked worker process - OE data and recipes are inherited from the parent (not pickled)
+        conf, oe, recipes = RecipeList.oe_match_state
+        return [RecipeList.match_recipe_oe(conf, oe, recipes[index]) for index in indexes]
+
+    def match_recipes_oe_parallel(self, conf: "Config", oe, indexes):
+        # Returns list of results in order of recipe indexes (or None if worker processes cannot be used)
+        try:
+            context = multiprocessing.get_context('fork')
+        except ValueError:
+            logging.warning("Unable to fork OE match worker processes - matching recipes serially")
+            return None
+
+        workers = min(conf.oe_match_workers, len(indexes), os.cpu_count() or 1)
+        if workers < 2:
+            logging.info("- Only 1 CPU available - matching recipes serially")
+            return None
+
+        start_time = time.time()
+        chunk_size = max(1, math.ceil(len(indexes) / (workers * 4)))
+        chunks = [indexes[start:start + chunk_size] for start in range(0, len(indexes), chunk_size)]
+        logging.info(f"- Matching {len(indexes)} recipes using {workers} worker processes ({len(chunks)} chunks)")
+        RecipeList.oe_match_state = (conf, oe, self.recipes)
+        try:
+            results = []
+            with context.Pool(workers) as pool:
+                for chunk_results in pool.map(RecipeList.match_recipes_oe_chunk, chunks):
+                    results += chunk_results
+        except (OSError, multiprocessing.ProcessError) as e:
+            logging.warning(f"Unable to run OE match worker processes - {e} - matching recipes serially")
+            return None
+        finally:
+            RecipeList.oe_match_state = None
+        logging.info(f"- Recipes matched in {time.time() - start_time:.1f} seconds")
+        return results
+
     def scan_pkg_download_files(self, conf: "Config", bom: "BOM"):
         all_pkg_files = BB.get_pkg_files(conf)
         all_download_files = BB.get_download_files(conf)
         found_files = self.find_files(conf, all_pkg_files, all_download_files)
         if len(found_files) > 0:
-            tdir = self.copy_files(conf, found_files)
-            if tdir and bom.run_detect_sigscan(conf, tdir):
+            scan_cache = ScanCache(conf)
+            if scan_cache.is_unchanged(found_files):
+                logging.info(f"Signature scan NOT run - the same {len(found_files)} package/download files (unchanged "
+                             f"content) were scanned into this project version by a previous run")
+                logging.info("- Existing signature scan results in the project version are retained "
+                             "(use --unmap or clear --cache_dir to force a new scan)")
                 return len(found_files), True
+            if conf.sig_scan_shards > 1:
+                ret = self.scan_files_sharded(conf, bom, found_files)
             else:
-                return len(found_files), False
+                tdir = self.copy_files(conf, found_files)
+                ret = tdir != '' and bom.run_detect_sigscan(conf, tdir)
+            if ret:
+                scan_cache.mark_scanned(found_files)
+                self.remove_stale_shards(conf, bom, found_files)
+            return len(found_files), ret
         return 0, False
 
+    @staticmethod
+    def split_shards(files, num_shards):
+        # Bin-pack files by size (largest first into the least loaded shard) - sorted by size and path so the same
+        # set of files always gives the same shards
+        sized = []
+        for file in files:
+            try:
+                size = os.path.getsize(file)
+            except OSError:
+                size = 0
+            sized.append((size, file))
+        shards = [[] for _ in range(num_shards)]
+        shard_sizes = [0] * num_shards
+        for size, file in sorted(sized, key=lambda entry: (-entry[0], entry[1])):
+            index = min(range(num_shards), key=lambda shard: (shard_sizes[shard], len(shards[shard]), shard))
+            shards[index].append(file)
+            shard_sizes[index] += size
+        return shards, shard_sizes
+
+    @staticmethod
+    def get_shard_codelocation(conf: "Config", index):
+        return f"{conf.bd_project}-{conf.bd_version}-sigscan-shard{index + 1}"
+
+    def scan_files_sharded(self, conf: "Config", bom: "BOM", files):
+        shards, shard_sizes = self.split_shards(files, conf.sig_scan_shards)
+        indexes = [index for index in range(len(shards)) if len(shards[index]) > 0]
+        if not bom.prepare_detect_jar(conf):
+            return False
+        logging.info(f"Running {len(indexes)} concurrent signature scans")
+
+        def run_shard(index):
+            start_time = time.time()
+            tdir = self.copy_files(conf, shards[index])
+            codeloc = self.get_shard_codelocation(conf, index)
+            ret = tdir != '' and bom.run_detect_sigscan(conf, tdir,
+                                                       extra_opt="--detect.code.location.name=" + shlex.quote(codeloc),
+                                                       label=f"Detect (shard {index + 1})")
+            return ret, time.time() - start_time
+
+        with ThreadPoolExecutor(max_workers=len(indexes)) as executor:
+            results = dict(zip(indexes, executor.map(run_shard, indexes)))
+
+        logging.info("Signature scan shard summary:")
+        for index in range(len(shards)):
+            if index not in results:
+                logging.info(f"- Shard {index + 1}: no files")
+                continue
+            ret, elapsed = results[index]
+            logging.info(f"- Shard {index + 1}: {len(shards[index])} files "
+                         f"({shard_sizes[index] / (1024 * 1024):.1f} MB) - "
+                         f"{'SUCCESS' if ret else 'FAILED'} in {elapsed:.1f} seconds")
+        failed = len([ret for ret, elapsed in results.values() if not ret])
+        if failed > 0:
+            logging.error(f"{failed} of {len(indexes)} signature scan shards failed")
+            return False
+        return True
+
+    @staticmethod
+    def get_unsharded_codelocation(conf: "Config"):
+        # Default Detect code location name for the unsharded scan (source folder/project/version - see copy_files())
+        return f"{conf.bd_project}_{conf.bd_version}/{conf.bd_project}/{conf.bd_version}"
+
+    def remove_stale_shards(self, conf: "Config", bom: "BOM", files):
+        # Shard code locations not used by this scan (empty shards or from a previous scan with more shards, or any
+        # shards if not sharded) would keep previous scan results in the project version - the unsharded scan code
+        # location is also removed after a sharded scan (unless the code location name is set in --detect_opts)
+        keep_names = []
+        remove_names = []
+        if conf.sig_scan_shards > 1:
+            shards, shard_sizes = self.split_shards(files, conf.sig_scan_shards)
+            keep_names = [self.get_shard_codelocation(conf, index) for index in range(len(shards))
+                          if len(shards[index]) > 0]
+            if 'detect.code.location.name' not in conf.detect_opts:
+                remove_names.append(self.get_unsharded_codelocation(conf))
+        prefix = f"{conf.bd_project}-{conf.bd_version}-sigscan-shard"
+        if bom.remove_stale_codelocations(conf, prefix, keep_names, remove_names) > 0:
+            logging.warning("Some signature scan shard code locations from previous scans could not be deleted - "
+                            "delete them manually to remove previous scan results from the project version")
+
     def find_files(self, conf, all_pkg_files, all_download_files):
         found_files = []
-        for recipe in self.recipes:
-            if not conf.scan_all_packages and recipe.matched_in_bom:
-                continue
+        recipes = [recipe for recipe in self.recipes if conf.scan_all_packages or not recipe.matched_in_bom]
+        matcher = FileMatcher(recipes, conf.image_package_type)
+
+        # Parse each basename once and collect matching files per recipe (in file order)
+        download_matches = {}
+        for path in all_download_files:
+            for recipe in matcher.match_download(os.path.basename(path)):
+                download_matches.setdefault(recipe.name, []).append(path)
+        pkg_matches = {}
+        for path in all_pkg_files:
+            for recipe in matcher.match_package(os.path.basename(path)):
+                pkg_matches.setdefault(recipe.name, []).append(path)
+
+        for recipe in recipes:
             found = False
-            recipe_esc = re.escape(recipe.name)
-            ver_esc = re.escape(recipe.version)
-            download_regex = re.compile(rf"^{recipe_esc}[_-]v?{ver_esc}[.-].*$")
-            pkg_regex = re.compile(rf"^(lib)?{recipe_esc}\d*[_-]v?{ver_esc}[+.-].*\.{conf.image_package_type}")
-
-            for path in all_download_files:
-                filename = os.path.basename(path)
-                download_res = download_regex.match(filename)
-                if download_res is not None:
-                    found_files.append(path)
-                    found = True
-                    logging.info(f"- Recipe:{recipe.name}/{recipe.version} - Located download file: {path}")
+            for path in download_matches.get(recipe.name, []):
+                found_files.append(path)
+                found = True
+                logging.info(f"- Recipe:{recipe.name}/{recipe.version} - Located download file: {path}")
 
             if found:
                 continue
 
-            for path in all_pkg_files:
-                filename = os.path.basename(path)
-                # pattern = f"{os.path.join(global_values.pkg_dir, global_values.machine)}/" \
-                #           f"{recipe}[-_]{ver}-*.{global_values.image_package_type}"
-                pkg_res = pkg_regex.match(filename)
-
-                if pkg_res is not None:
-                    found_files.append(path)
-                    logging.info(f"- Recipe:{recipe.name}/{recipe.version} - Located package file: {path}")
-                    found = True
+            for path in pkg_matches.get(recipe.name, []):
+                found_files.append(path)
+                logging.info(f"- Recipe:{recipe.name}/{recipe.version} - Located package file: {path}")
+                found = True
 
             if not found:
                 logging.info(f"- Recipe:{recipe.name}/{recipe.version} - No package file found")
@@ -145,20 +312,44 @@ class RecipeList:
     @staticmethod
     def copy_files(conf, files):
         try:
-            temppkgdir = tempfile.mkdtemp(prefix="bd_sig_pkgs")
+            temppkgdir = tempfile.mkdtemp(prefix="bd_sig_pkgs", dir=(conf.sig_scan_staging_dir or None))
             proj_string = conf.bd_project + "_" + conf.bd_version
             temppkgdir = os.path.join(temppkgdir, proj_string)
             if not os.path.isdir(temppkgdir):
                 # os.mkdir(temppkgdir)
                 os.makedirs(temppkgdir, exist_ok=True)
 
-            count = 0
+            logging.info(f"Copying recipe package files")
+            start_time = time.time()
+            staged = {}
             for file in files:
-                shutil.copy(file, temppkgdir)
-                count += 1
+                # Later files with the same name replace earlier ones (as for a sequential copy)
+                staged[os.path.join(temppkgdir, os.path.basename(file))] = file
+
+            count = 0
+            linked = 0
+            to_copy = []
+            failed_methods = {}
+            for dst, src in staged.items():
+                method = ''
+                if conf.sig_scan_staging == 'link':
+                    method = RecipeList.link_file(src, dst, failed_methods)
+                if method:
+                    linked += 1
+                    count += 1
+                else:
+                    to_copy.append((src, dst))
+
+            copied_bytes = 0
+            if len(to_copy) > 0:
+                with ThreadPoolExecutor(max_workers=min(8, len(to_copy))) as executor:
+                    for size in executor.map(RecipeList.copy_file, to_copy):
+                        copied_bytes += size
+                        count += 1
 
-            logging.info(f"Copying recipe package files")
             logging.info(f"- Copied {count} package files ...")
+            logging.info(f"- Staged {linked} files by reflink/hardlink and copied {len(to_copy)} files "
+                         f"({copied_bytes / (1024 * 1024):.1f} MB) in {time.time() - start_time:.1f} seconds")
             if count > 0:
                 return temppkgdir
 
@@ -166,6 +357,46 @@ class RecipeList:
             logging.error(f"Unable to copy package files {e}")
         return ''
 
+    @staticmethod
+    def link_file(src, dst, failed_methods):
+        # Try reflink then hardlink of the real file - returns method used or '' if file must be copied
+        # failed_methods records methods not supported for each source device so they are not retried
+        realsrc = os.path.realpath(src)
+        try:
+            dev = os.stat(realsrc).st_dev
+        except OSError:
+            return ''
+        if os.path.lexists(dst):
+            os.remove(dst)
+        failed = failed_methods.setdefault(dev, set())
+
+        if 'reflink' not in failed and hasattr(fcntl, 'ioctl'):
+            try:
+                with open(realsrc, "rb") as infile, open(dst, "wb") as outfile:
+                    fcntl.ioctl(outfile.fileno(), FICLONE, infile.fileno())
+                shutil.copystat(realsrc, dst)
+                return 'reflink'
+            except OSError as e:
+                logging.debug(f"Reflink not available for {realsrc} - {e}")
+                failed.add('reflink')
+                if os.path.lexists(dst):
+                    os.remove(dst)
+
+        if 'hardlink' not in failed:
+            try:
+                os.link(realsrc, dst)
+                return 'hardlink'
+            except OSError as e:
+                logging.debug(f"Hardlink not available for {realsrc} - {e}")
+                failed.add('hardlink')
+        return ''
+
+    @staticmethod
+    def copy_file(entry):
+        src, dst = entry
+        shutil.copy(src, dst)
+        return os.path.getsize(dst)
+
     def report_recipes_in_bom(self, conf: "Config"):
 
         in_bom = []
@@ -381,4 +612,7 @@ class RecipeList:
             return False
 
     def remove_recipe(self, rec_name):
-        self.recipes = [rec for rec in self.recipes if rec.name != rec_name]
+        recipe = self.recipe_dict.pop(rec_name, None)
+        if recipe is None:
+            return
+        self.recipes.remove(recipe)
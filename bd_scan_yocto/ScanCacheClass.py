@@ -0,0 +1,85 @@
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from .CacheClass import Cache
+
+
+class ScanCache:
+    # Records content hashes of the archives last signature scanned into each project version
+    # The full set of files is always scanned (a rescan replaces the code location contents) - the record is only
+    # used to skip the scan when the set of archives and the scan options are unchanged
+    # hashes - path: [size, mtime_ns, sha256] (content hash memoized until file size or mtime changes)
+    # scanned - 'url|project/version': {'options': hash of scan options, 'files': {sha256: basename}}
+    def __init__(self, conf: "Config"):
+        self.cfile = Cache.get_path(conf, 'scan_cache.json')
+        self.projver = f"{conf.bd_url.rstrip('/')}|{conf.bd_project}/{conf.bd_version}"
+        self.options = Cache.fingerprint([conf.detect_opts, conf.sig_scan_shards])
+        self.hashes = {}
+        self.scanned = {}
+
+        data = Cache.load_json(self.cfile)
+        if data is not None:
+            self.hashes = data.get('hashes', {})
+            self.scanned = data.get('scanned', {})
+        if conf.unmap:
+            # Previous scans are unmapped so archives need to be scanned again
+            self.clear("--unmap specified")
+
+    def clear(self, reason):
+        # Forget the files scanned into this project version (for example when the version has been created)
+        if self.projver not in self.scanned:
+            return
+        logging.info(f"Clearing record of previously scanned files for '{self.projver}' ({reason})")
+        del self.scanned[self.projver]
+        self.save()
+
+    def enabled(self):
+        return self.cfile != ''
+
+    def get_hash(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return ''
+        entry = self.hashes.get(path)
+        if entry is not None and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            return entry[2]
+        sha = Cache.file_fingerprint(path)
+        self.hashes[path] = [st.st_size, st.st_mtime_ns, sha]
+        return sha
+
+    def get_hashes(self, files):
+        # Hash files in parallel (hashlib releases the GIL while hashing each block)
+        if len(files) == 0:
+            return []
+        with ThreadPoolExecutor(max_workers=min(8, len(files))) as executor:
+            return list(executor.map(self.get_hash, files))
+
+    def is_unchanged(self, files):
+        # Returns True if exactly the same archive contents were last scanned into this project version
+        if not self.enabled() or self.projver not in self.scanned:
+            return False
+        record = self.scanned[self.projver]
+        if not isinstance(record, dict) or record.get('options') != self.options:
+            # Detect options or number of shards changed since the last scan
+            return False
+        hashes = self.get_hashes(files)
+        self.save()
+        if '' in hashes:
+            return False
+        return set(hashes) == set(record.get('files', {}).keys())
+
+    def mark_scanned(self, files):
+        # Replaces the record for this project version with the files in the latest (full) scan
+        if not self.enabled():
+            return
+        scanned = {}
+        for path, sha in zip(files, self.get_hashes(files)):
+            if sha:
+                scanned[sha] = os.path.basename(path)
+        self.scanned[self.projver] = {'options': self.options, 'files': scanned}
+        self.save()
+
+    def save(self):
+        Cache.save_json(self.cfile, {'hashes': self.hashes, 'scanned': self.scanned})
@@ -4,6 +4,7 @@ from .BOMClass import BOM
 from .OEClass import OE
 from .BBClass import BB
 from .ConfigClass import Config
+from .ScanCacheClass import ScanCache
 import logging
 import sys
 
@@ -29,21 +30,33 @@ def main():
 
     bom = BOM(conf)
 
+    init_runner = None
     if bom.get_proj():
         logging.info(f"Project {conf.bd_project} Version {conf.bd_version} already exists")
     elif conf.output_file == '':
-        logging.info("Running Detect to initialise project")
-        extra_opt = '--detect.tools=DETECTOR'
-        if conf.unmap:
-            extra_opt += ' --detect.project.codelocation.unmap=true'
-        if not bom.run_detect_sigscan(conf, empty_dir.name,
-                                      extra_opt=extra_opt):
-            logging.error("Unable to run Detect to initialise project")
-            sys.exit(2)
+        # Any signature scans recorded for this version were into a version which no longer exists
+        ScanCache(conf).clear("project version does not exist")
+        if conf.create_project_via_detect or not bom.create_projver(conf):
+            # Detect runs in the background while the Bitbake environment is processed
+            logging.info("Running Detect to initialise project")
+            extra_opt = '--detect.tools=DETECTOR'
+            if conf.unmap:
+                extra_opt += ' --detect.project.codelocation.unmap=true'
+            init_runner = bom.start_detect_sigscan(conf, empty_dir.name, extra_opt=extra_opt, cleanup=False,
+                                                   label='Detect (initialise project)')
+            if init_runner is None:
+                logging.error("Unable to run Detect to initialise project")
+                sys.exit(2)
 
     reclist = RecipeList()
 
     if not bb.process(conf, reclist):
+        if init_runner is not None:
+            init_runner.terminate()
+        sys.exit(2)
+
+    if init_runner is not None and not init_runner.wait():
+        logging.error("Unable to run Detect to initialise project")
         sys.exit(2)
 
     logging.info("")
@@ -54,7 +67,7 @@ def main():
             logging.info("Not using OE data cache folder (consider using --oe_data_folder) ...")
 
         if not conf.skip_oe_data:
-            oe_class = OE(conf)
+            oe_class = OE(conf, recipe_names=[recipe.name for recipe in reclist.recipes])
             logging.info("")
             logging.info("--- PHASE 2 - MATCH RECIPES AGAINST OE DATA ------------------------------")
             logging.info("")
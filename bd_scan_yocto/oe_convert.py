@@ -0,0 +1,36 @@
+import argparse
+import logging
+import os
+import sys
+import time
+
+from .OEClass import OE
+
+
+def main():
+    # Convert OE recipes JSON data file (oe_recipes.json) into binary recipe store (oe_recipes.bin)
+    parser = argparse.ArgumentParser(description='Convert cached OE recipes JSON file to binary recipe store',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--oe_data_folder", type=str, required=True,
+                        help="Folder containing oe_recipes.json (from bd-scan-yocto-via-sbom --oe_data_folder)")
+    parser.add_argument("--output", type=str, default="",
+                        help="OPTIONAL Binary store file to write (default oe_recipes.bin in --oe_data_folder)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+    lfile = os.path.join(args.oe_data_folder, 'oe_recipes.json')
+    bfile = args.output if args.output else os.path.join(args.oe_data_folder, 'oe_recipes.bin')
+    if not os.path.isfile(lfile):
+        logging.error(f"OE recipes file {lfile} does not exist")
+        sys.exit(2)
+
+    start_time = time.time()
+    recipe_store = OE.process_recipes(OE.load_oe_data_file(lfile, 'recipes'))
+    if recipe_store.count() == 0 or not recipe_store.save_binary(bfile, lfile):
+        logging.error("Unable to convert OE recipes file")
+        sys.exit(2)
+    logging.info(f"Converted {recipe_store.count()} OE recipes in {time.time() - start_time:.1f} seconds")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+# Benchmark of the task-depends.dot parser against the previous line parser on a scaled up copy of
+# test/data/task-depends.dot (recipes renamed in each copy so the parsed recipe set grows with the file)
+#
+#   python test/benchmark_task_depends.py [--scale N] [--repeat N]
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bd_scan_yocto.BBClass import BB  # noqa: E402
+from test_task_depends import read_task_depends_dot_lines, task_depends_file  # noqa: E402
+
+recipe_pattern = re.compile(r'"([^". ]+)\.')
+
+
+def write_scaled_file(outfile, scale):
+    with open(task_depends_file, "r") as tdfile:
+        lines = tdfile.read().splitlines()
+    body = [line for line in lines if line.startswith('"')]
+    outfile.write('digraph depends {\n')
+    for copy in range(scale):
+        outfile.write('\n'.join(recipe_pattern.sub(rf'"\1-copy{copy}.', line) for line in body))
+        outfile.write('\n')
+    outfile.write('}\n')
+
+
+def run(label, func, path, repeat):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        result = func(path)
+        times.append(time.perf_counter() - start_time)
+    best = min(times)
+    size = os.path.getsize(path) / (1024 * 1024)
+    print(f"{label:<24} {best:8.2f}s  {size / best:8.1f} MB/s  ({len(result)} recipes)")
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark task-depends.dot parsers')
+    parser.add_argument("--scale", type=int, default=100, help="Copies of test/data/task-depends.dot")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of each parser (best time reported)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tdir:
+        path = os.path.join(tdir, 'task-depends.dot')
+        with open(path, "w") as outfile:
+            write_scaled_file(outfile, args.scale)
+        print(f"{path}: {os.path.getsize(path) / (1024 * 1024):.1f} MB, {os.cpu_count()} CPUs")
+        expected, old_time = run('previous line parser', read_task_depends_dot_lines, path, args.repeat)
+        result, new_time = run('mmap chunk parser', BB.read_task_depends_dot, path, args.repeat)
+        if result != expected:
+            print("ERROR: parsers returned different results")
+            return 1
+        print(f"Speed-up {old_time / new_time:.1f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
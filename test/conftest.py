@@ -0,0 +1,31 @@
+import json
+import os
+
+import pytest
+
+from bd_scan_yocto.OEClass import OE
+
+data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+
+@pytest.fixture
+def load_oe():
+    # Factory - OE instance (or subclass) loaded from test/data/oe_data.json without fetching from the layerindex
+    # (preferred branches set from conf if specified)
+    with open(os.path.join(data_dir, 'oe_data.json'), "r") as infile:
+        data = json.load(infile)
+
+    def load(cls=OE, conf=None):
+        oe = cls.__new__(cls)
+        oe.layerid_dict = {layer['id']: layer for layer in data['layers']}
+        oe.layerbranchid_dict = {layerbranch['id']: layerbranch for layerbranch in data['layerbranches']}
+        oe.branchid_dict = {branch['id']: branch for branch in data['branches']}
+        oe.version_index_dict = {}
+        oe.preferred_branches = []
+        oe.preferred_layerbranches = set()
+        oe.recipe_store = OE.process_recipes(data['recipes'])
+        if conf is not None:
+            oe.set_preferred_branches(conf)
+        return oe
+
+    return load
@@ -0,0 +1,67 @@
+import os
+import shutil
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from bd_scan_yocto.BBClass import BB
+
+data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+# Fake bitbake commands - the bitbake server lock is held while each command runs
+bitbake_script = '''#!/bin/sh
+flock {lock} sh -c 'sleep {delay}; echo "MANIFEST_FILE=\\"/build/license.manifest\\""; echo "IMAGE_PKGTYPE=\\"rpm\\""'
+echo run >> {log}
+'''
+layers_script = '''#!/bin/sh
+flock {lock} sh -c 'sleep {delay}; cat {layers}'
+echo run >> {log}
+'''
+
+
+@pytest.fixture
+def fake_bitbake(tmp_path, monkeypatch):
+    if shutil.which('flock') is None:
+        pytest.skip('flock not available')
+    bindir = tmp_path / 'bin'
+    bindir.mkdir()
+    values = dict(lock=tmp_path / 'bitbake.lock', delay=1.5, layers=os.path.join(data_dir, 'layers.txt'))
+    for name, script in [('bitbake', bitbake_script), ('bitbake-layers', layers_script)]:
+        path = bindir / name
+        path.write_text(script.format(log=tmp_path / f"{name}.log", **values))
+        path.chmod(0o755)
+    monkeypatch.setenv('PATH', f"{bindir}{os.pathsep}{os.environ['PATH']}")
+    return tmp_path
+
+
+def make_conf(tmp_path, timeout):
+    return SimpleNamespace(bitbake_timeout=timeout, cache_dir='', cache_refresh=False, build_dir=str(tmp_path),
+                           license_manifest='', image_package_type='', log_dir='', package_dir='', deploy_dir='',
+                           download_dir='', machine='', license_dir='', distro_codename='',
+                           layerseries_corenames='', pkgdata_dir='', buildhistory_dir='')
+
+
+def run_count(tmp_path, name):
+    with open(tmp_path / f"{name}.log", "r") as logfile:
+        return len(logfile.readlines())
+
+
+def test_commands_run_once_each(fake_bitbake):
+    conf = make_conf(fake_bitbake, 5)
+    layer_entries = BB().run_bitbake_commands(conf)
+    assert ['acl', 'meta', '2.3.2'] in layer_entries
+    assert conf.license_manifest == '/build/license.manifest'
+    assert conf.image_package_type == 'rpm'
+    assert run_count(fake_bitbake, 'bitbake') == 1
+    assert run_count(fake_bitbake, 'bitbake-layers') == 1
+
+
+def test_hung_command_fails_after_timeout(fake_bitbake):
+    # Each command is stopped after --bitbake_timeout (not retried)
+    conf = make_conf(fake_bitbake, 0.5)
+    start_time = time.time()
+    assert BB().run_bitbake_commands(conf) is None
+    assert time.time() - start_time < 2
+    assert not os.path.exists(fake_bitbake / 'bitbake.log')
+    assert not os.path.exists(fake_bitbake / 'bitbake-layers.log')
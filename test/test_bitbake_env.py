@@ -0,0 +1,54 @@
+from bd_scan_yocto import BBClass
+from bd_scan_yocto.BBClass import BB
+
+env = {
+    'BUILDHISTORY_DIR': '/build/buildhistory',
+    'DEPLOY_DIR': '/build/tmp/deploy',
+    'DEPLOY_DIR_DEB': '/build/tmp/deploy/deb',
+    'DEPLOY_DIR_IPK': '/build/tmp/deploy/ipk',
+    'DEPLOY_DIR_RPM': '/build/tmp/deploy/rpm',
+    'DISTRO_CODENAME': 'scarthgap',
+    'DL_DIR': '/build/downloads',
+    'IMAGE_PKGTYPE': 'rpm',
+    'LAYERSERIES_CORENAMES': 'scarthgap',
+    'LICENSE_DIR': '/build/tmp/deploy/licenses',
+    'LOG_DIR': '/build/tmp/log',
+    'MACHINE_ARCH': 'qemux86_64',
+    'MANIFEST_FILE': '/build/tmp/deploy/licenses/image/license.manifest',
+    'PKGDATA_DIR': '/build/tmp/pkgdata/qemux86-64',
+}
+
+
+def get_sorted_lines(variables, read):
+    # 'bitbake -e' output - comments and variables sorted by name followed by functions
+    for var in sorted(variables + ['AAA', 'BBPATH', 'MACHINE', 'PATH', 'PN', 'TMPDIR', 'WORKDIR', 'bindir']):
+        read.append(var)
+        yield f"# ${var}\n"
+        yield f'{var}="{env.get(var, "x")}"\n'
+    read.append('functions')
+    yield 'do_build() {\n'
+    yield '\t:\n'
+    yield '}\n'
+
+
+def test_sorted_output_includes_optional_variables():
+    read = []
+    assert BB.get_bitbake_env_vars(get_sorted_lines(list(env), read)) == env
+    # All registered variables found - remaining output not read
+    assert read[-1] == 'PKGDATA_DIR'
+
+
+def test_sorted_output_stops_after_last_variable():
+    read = []
+    variables = [var for var in env if var not in ('BUILDHISTORY_DIR', 'PKGDATA_DIR')]
+    assert BB.get_bitbake_env_vars(get_sorted_lines(variables, read)) == {var: env[var] for var in variables}
+    # Stops at the first variable sorting after PKGDATA_DIR
+    assert read[-1] == 'PN'
+
+
+def test_missing_required_variable_reads_all_output(monkeypatch):
+    monkeypatch.setattr(BBClass, 'bitbake_env_required', BBClass.bitbake_env_required | {'ZZZ_REQUIRED'})
+    read = []
+    variables = [var for var in env if var != 'PKGDATA_DIR']
+    BB.get_bitbake_env_vars(get_sorted_lines(variables, read))
+    assert read[-1] == 'functions'
@@ -0,0 +1,102 @@
+from types import SimpleNamespace
+
+import pytest
+
+from bd_scan_yocto.BOMClass import BOM
+from bd_scan_yocto.RecipeListClass import RecipeList
+
+
+class FakeSession:
+    def __init__(self):
+        self.deleted = []
+
+    def delete(self, href):
+        self.deleted.append(href)
+        return SimpleNamespace(ok=True, status_code=204)
+
+
+class FakeClient:
+    def __init__(self, names):
+        self.names = names
+        self.session = FakeSession()
+
+    def get_resource(self, name, parent=None):
+        assert name == 'codelocations'
+        return [{'name': name, '_meta': {'href': name}} for name in self.names]
+
+
+def make_bom(names):
+    bom = BOM.__new__(BOM)
+    bom.bdprojname = 'proj'
+    bom.bdvername = 'ver'
+    bom.bdver_dict = {'versionName': 'ver'}
+    bom.bd = FakeClient(names)
+    return bom
+
+
+def make_conf(shards, detect_opts=''):
+    return SimpleNamespace(bd_project='proj', bd_version='ver', sig_scan_shards=shards, detect_opts=detect_opts)
+
+
+def shard_files(count):
+    # Files which fill only the first count shards (files of equal size are spread over the shards in order)
+    return [f"/dl/file{index}.tar.gz" for index in range(count)]
+
+
+@pytest.mark.parametrize('suffix', ['', ' scan', ' signature'])
+def test_scanned_shards_are_kept(suffix):
+    conf = make_conf(3)
+    names = [f"proj-ver-sigscan-shard{index}{suffix}" for index in range(1, 6)]
+    names += ['proj/ver sbom', 'other-ver-sigscan-shard1 scan']
+    bom = make_bom(names)
+    assert RecipeList().remove_stale_shards(conf, bom, shard_files(3)) is None
+    assert bom.bd.session.deleted == [f"proj-ver-sigscan-shard{index}{suffix}" for index in [4, 5]]
+
+
+def test_shard10_is_not_kept_by_shard1():
+    assert BOM.is_stale_codelocation('proj-ver-sigscan-shard10 scan', 'proj-ver-sigscan-shard',
+                                     ['proj-ver-sigscan-shard1'])
+    assert not BOM.is_stale_codelocation('proj-ver-sigscan-shard1 scan', 'proj-ver-sigscan-shard',
+                                         ['proj-ver-sigscan-shard1'])
+
+
+def test_unsharded_codelocation_removed_after_sharded_scan():
+    conf = make_conf(2)
+    names = ['proj_ver/proj/ver scan', 'proj-ver-sigscan-shard1 scan', 'proj-ver-sigscan-shard2 scan']
+    bom = make_bom(names)
+    RecipeList().remove_stale_shards(conf, bom, shard_files(2))
+    assert bom.bd.session.deleted == ['proj_ver/proj/ver scan']
+
+    conf = make_conf(2, detect_opts='--detect.code.location.name=mine')
+    bom = make_bom(names)
+    RecipeList().remove_stale_shards(conf, bom, shard_files(2))
+    assert bom.bd.session.deleted == []
+
+
+def test_unsharded_scan_removes_all_shards():
+    conf = make_conf(1)
+    names = ['proj_ver/proj/ver scan', 'proj-ver-sigscan-shard1 scan', 'proj-ver-sigscan-shard2']
+    bom = make_bom(names)
+    RecipeList().remove_stale_shards(conf, bom, ['/dl/file.tar.gz'])
+    assert bom.bd.session.deleted == ['proj-ver-sigscan-shard1 scan', 'proj-ver-sigscan-shard2']
+
+
+def test_split_shards_by_size(tmp_path):
+    sizes = [900, 500, 400, 300, 300, 200, 100, 0]
+    files = []
+    for index, size in enumerate(sizes):
+        path = tmp_path / f"file{index}.tar.gz"
+        path.write_bytes(b'x' * size)
+        files.append(str(path))
+    shards, shard_sizes = RecipeList.split_shards(files, 3)
+    assert sorted(shard_sizes) == [900, 900, 900]
+    assert sorted(file for shard in shards for file in shard) == sorted(files)
+    # Same shards for the same set of files in any order
+    assert RecipeList.split_shards(list(reversed(files)), 3) == (shards, shard_sizes)
+    # Largest file first into the first shard
+    assert shards[0][0] == files[0]
+
+
+def test_split_shards_more_shards_than_files():
+    shards, shard_sizes = RecipeList.split_shards(['/dl/a.tar.gz', '/dl/b.tar.gz'], 4)
+    assert [len(shard) for shard in shards] == [1, 1, 0, 0]
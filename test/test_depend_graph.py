@@ -0,0 +1,111 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from bd_scan_yocto.BBClass import BB
+from bd_scan_yocto.DependGraphClass import DependGraph
+from bd_scan_yocto.RecipeListClass import RecipeList
+from test_task_depends import read_task_depends_dot_lines
+
+data_dir = os.path.join(os.path.dirname(__file__), 'data')
+task_depends_file = os.path.join(data_dir, 'task-depends.dot')
+# The image lists its whole closure as direct task dependencies - busybox has a deeper dependency tree
+targets = ['core-image-minimal', 'busybox']
+
+
+def make_conf(target, max_depth=1, exclude_native=False):
+    return SimpleNamespace(task_depends_dot_file=task_depends_file, target=target, license_manifest='',
+                           exclude_recipes=[], task_depends_max_depth=max_depth,
+                           task_depends_exclude_native=exclude_native)
+
+
+def process(conf):
+    reclist = RecipeList()
+    BB.process_task_depends_dot(conf, reclist)
+    return [(rec.name, rec.version, rec.release) for rec in reclist.recipes]
+
+
+def previous_depth_one(recipe_dict, target):
+    # Previous processing - direct children of target only
+    return [(recipe, recipe_dict[recipe]['ver'], recipe_dict[recipe]['rel'])
+            for recipe in recipe_dict[target]['children'] if recipe in recipe_dict]
+
+
+def reachable(recipe_dict, target, max_depth=0, exclude_native=False):
+    # Reference closure by depth-limited level expansion over the previous parser output
+    seen = {target}
+    level = [target]
+    depth = 0
+    while level and (max_depth == 0 or depth < max_depth):
+        next_level = []
+        for recipe in level:
+            for child in recipe_dict.get(recipe, {}).get('children', []):
+                if child in seen:
+                    continue
+                seen.add(child)
+                if exclude_native and DependGraph.is_native(child):
+                    continue
+                next_level.append(child)
+        level = next_level
+        depth += 1
+    seen.discard(target)
+    return {recipe for recipe in seen
+            if recipe in recipe_dict and not (exclude_native and DependGraph.is_native(recipe))}
+
+
+@pytest.fixture(scope='module')
+def recipe_dict():
+    return read_task_depends_dot_lines(task_depends_file)
+
+
+@pytest.mark.parametrize('target', targets)
+def test_depth_one_matches_previous_result(recipe_dict, target):
+    expected = previous_depth_one(recipe_dict, target)
+    assert len(expected) > 0
+    assert process(make_conf(target)) == expected
+
+
+@pytest.mark.parametrize('target', targets)
+@pytest.mark.parametrize('max_depth', [0, 2, 3])
+def test_max_depth_closure(recipe_dict, target, max_depth):
+    names = [name for name, ver, rel in process(make_conf(target, max_depth=max_depth))]
+    assert len(names) == len(set(names))
+    assert set(names) == reachable(recipe_dict, target, max_depth=max_depth)
+    # Direct dependencies come first in the same order as the depth 1 result
+    direct = [name for name, ver, rel in previous_depth_one(recipe_dict, target)]
+    assert names[:len(direct)] == direct
+
+
+def test_depth_increases_closure(recipe_dict):
+    sizes = [len(process(make_conf('busybox', max_depth=depth))) for depth in (1, 2, 3, 0)]
+    assert sizes[0] < sizes[1] < sizes[2] < sizes[3]
+    assert sizes[3] == len(reachable(recipe_dict, 'busybox'))
+
+
+@pytest.mark.parametrize('target', targets)
+@pytest.mark.parametrize('max_depth', [0, 1, 2])
+def test_exclude_native(recipe_dict, target, max_depth):
+    names = {name for name, ver, rel in process(make_conf(target, max_depth=max_depth, exclude_native=True))}
+    assert len(names) > 0
+    assert not any(DependGraph.is_native(name) for name in names)
+    assert names == reachable(recipe_dict, target, max_depth=max_depth, exclude_native=True)
+    assert names < {name for name, ver, rel in process(make_conf(target, max_depth=max_depth))}
+
+
+def test_exclude_native_prunes_native_subtrees():
+    # Recipes only reachable through a native recipe are dropped with it
+    recipe_dict = {
+        'image': {'children': ['libc', 'tool-native', 'nativesdk-sdk']},
+        'libc': {'children': ['kernel-headers']},
+        'tool-native': {'children': ['zlib-native', 'only-via-native']},
+        'nativesdk-sdk': {'children': ['libc']},
+        'kernel-headers': {'children': []},
+        'only-via-native': {'children': []},
+    }
+    graph = DependGraph(recipe_dict)
+    assert graph.get_dependencies('image') == ['libc', 'tool-native', 'nativesdk-sdk', 'kernel-headers',
+                                               'zlib-native', 'only-via-native']
+    assert graph.get_dependencies('image', exclude_native=True) == ['libc', 'kernel-headers']
+    assert graph.get_dependencies('image', max_depth=1, exclude_native=True) == ['libc']
+    assert graph.get_dependencies('missing') == []
@@ -0,0 +1,28 @@
+import atexit
+import time
+
+from bd_scan_yocto.DetectRunnerClass import DetectRunner
+
+
+def test_terminate_stops_background_run(monkeypatch):
+    registered = []
+    monkeypatch.setattr(atexit, 'register', registered.append)
+    monkeypatch.setattr(atexit, 'unregister', registered.remove)
+    runner = DetectRunner(['sh', '-c', 'sleep 60'], label='Detect (test)')
+    assert runner.start()
+    assert registered == [runner.terminate]
+    start_time = time.time()
+    runner.terminate(grace=5)
+    assert time.time() - start_time < 5
+    assert not runner.is_running()
+    assert not runner.wait()
+    assert registered == []
+
+
+def test_completed_run_not_terminated():
+    runner = DetectRunner(['sh', '-c', 'echo code location name: test'], label='Detect (test)')
+    assert runner.start()
+    assert runner.wait()
+    runner.terminate()
+    assert runner.retval == 0
+    assert runner.ids == {'code location name': 'test'}
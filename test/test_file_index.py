@@ -0,0 +1,143 @@
+import glob
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from bd_scan_yocto.FileIndexClass import FileIndex
+
+
+@pytest.fixture
+def conf(tmp_path):
+    cache_dir = tmp_path / 'cache'
+    cache_dir.mkdir()
+    yield SimpleNamespace(cache_dir=str(cache_dir))
+    FileIndex.close_all()
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / 'deploy'
+    for path in ['rpm/core2_64/zlib-1.3-r0.core2_64.rpm', 'rpm/core2_64/acl-2.3.2-r0.core2_64.rpm',
+                 'rpm/noarch/base-files-3.0-r0.noarch.rpm', 'rpm/repodata/repomd.xml', 'rpm/.hidden.rpm',
+                 'licenses/image-a/license.manifest', 'licenses/image-b/license.manifest', 'dl/zlib-1.3.tar.xz',
+                 'dl/zlib-1.3.tar.xz.done', 'dl/git2/github.com.madler.zlib/HEAD']:
+        path = root / path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(path.name)
+    return root
+
+
+def count_scans(monkeypatch):
+    scanned = []
+    scan_dir = FileIndex.scan_dir
+
+    def counting_scan_dir(self, folder, mtime):
+        scanned.append(folder)
+        return scan_dir(self, folder, mtime)
+    monkeypatch.setattr(FileIndex, 'scan_dir', counting_scan_dir)
+    return scanned
+
+
+@pytest.mark.parametrize('subdir, pattern, recursive', [('rpm', '*.rpm', True), ('dl', '*', False),
+                                                        ('', '*', True), ('licenses', 'license.manifest', True)])
+def test_find_files_same_as_glob(conf, tree, subdir, pattern, recursive):
+    root = str(tree / subdir)
+    no_index = SimpleNamespace(cache_dir='')
+    expected = FileIndex.find_files(no_index, root, pattern, recursive)
+    assert len(expected) > 0
+    assert sorted(FileIndex.find_files(conf, root, pattern, recursive)) == sorted(expected)
+    if recursive:
+        assert sorted(expected) == sorted(glob.glob(os.path.join(root, '**', pattern), recursive=True))
+
+
+def test_unchanged_folders_not_rescanned(conf, tree, monkeypatch):
+    scanned = count_scans(monkeypatch)
+    FileIndex.find_files(conf, str(tree))
+    assert len(scanned) == 11
+    scanned.clear()
+    FileIndex.find_files(conf, str(tree))
+    assert scanned == []
+
+    # New file changes the folder mtime - only that folder is rescanned
+    (tree / 'rpm/noarch/vim-9.1-r0.noarch.rpm').write_text('vim')
+    assert str(tree / 'rpm/noarch/vim-9.1-r0.noarch.rpm') in FileIndex.find_files(conf, str(tree / 'rpm'), '*.rpm')
+    assert scanned == [str(tree / 'rpm/noarch')]
+
+
+def test_index_persisted(conf, tree, monkeypatch):
+    FileIndex.find_files(conf, str(tree))
+    FileIndex.close_all()
+    assert FileIndex.indexes == {}
+    scanned = count_scans(monkeypatch)
+    assert len(FileIndex.find_files(conf, str(tree), '*.rpm')) == 3
+    assert scanned == []
+
+
+def test_folder_mtime_invalidation(conf, tree):
+    folder = tree / 'rpm/core2_64'
+    FileIndex.find_files(conf, str(tree))
+    st = os.stat(folder)
+    (folder / 'bzip2-1.0.8-r0.core2_64.rpm').write_text('bzip2')
+    (folder / 'zlib-1.3-r0.core2_64.rpm').unlink()
+
+    # Folder mtime unchanged - index is used as is
+    os.utime(folder, ns=(st.st_atime_ns, st.st_mtime_ns))
+    names = [os.path.basename(path) for path in FileIndex.find_files(conf, str(folder), '*.rpm')]
+    assert names == ['acl-2.3.2-r0.core2_64.rpm', 'zlib-1.3-r0.core2_64.rpm']
+
+    os.utime(folder, ns=(st.st_atime_ns, st.st_mtime_ns + 1000000))
+    names = [os.path.basename(path) for path in FileIndex.find_files(conf, str(folder), '*.rpm')]
+    assert names == ['acl-2.3.2-r0.core2_64.rpm', 'bzip2-1.0.8-r0.core2_64.rpm']
+
+
+def test_find_latest_file(conf, tree):
+    licdir = str(tree / 'licenses')
+    first = tree / 'licenses/image-a/license.manifest'
+    second = tree / 'licenses/image-b/license.manifest'
+    os.utime(first, ns=(0, 1000000000))
+    os.utime(second, ns=(0, 2000000000))
+    assert FileIndex.find_latest_file(conf, licdir, 'license.manifest') == str(second)
+
+    # File rewritten in place does not change the folder mtime but is still found as latest
+    folder_st = os.stat(first.parent)
+    first.write_text('rewritten')
+    os.utime(first, ns=(0, 3000000000))
+    os.utime(first.parent, ns=(folder_st.st_atime_ns, folder_st.st_mtime_ns))
+    assert FileIndex.find_latest_file(conf, licdir, 'license.manifest') == str(first)
+
+    # Indexed file which has been removed is skipped
+    first.unlink()
+    os.utime(first.parent, ns=(folder_st.st_atime_ns, folder_st.st_mtime_ns))
+    assert FileIndex.find_latest_file(conf, licdir, 'license.manifest') == str(second)
+    assert FileIndex.find_latest_file(conf, licdir, 'missing.manifest') == ''
+
+
+def test_removed_folders(conf, tree):
+    FileIndex.find_files(conf, str(tree))
+    findex = FileIndex.get_index(conf)
+    for path in ['rpm/core2_64', 'rpm/noarch', 'rpm/repodata']:
+        for file in (tree / path).iterdir():
+            file.unlink()
+        (tree / path).rmdir()
+    assert FileIndex.find_files(conf, str(tree / 'rpm'), '*.rpm') == []
+    low = str(tree / 'rpm') + os.sep
+    assert findex.db.execute("SELECT COUNT(*) FROM files WHERE path > ? AND path < ?",
+                             (low, low[:-1] + chr(ord(os.sep) + 1))).fetchone()[0] == 0
+    assert findex.db.execute("SELECT COUNT(*) FROM dirs WHERE path LIKE ?", (low + '%',)).fetchone()[0] == 0
+
+    # Removed root folder
+    for path in sorted(tree.glob('dl/**/*'), reverse=True):
+        path.rmdir() if path.is_dir() else path.unlink()
+    (tree / 'dl').rmdir()
+    assert FileIndex.find_files(conf, str(tree / 'dl')) == []
+    assert findex.db.execute("SELECT COUNT(*) FROM dirs WHERE path = ?", (str(tree / 'dl'),)).fetchone()[0] == 0
+
+
+def test_close_all(conf, tree):
+    FileIndex.find_files(conf, str(tree))
+    findex = FileIndex.get_index(conf)
+    FileIndex.close_all()
+    with pytest.raises(Exception):
+        findex.db.execute("SELECT 1")
+    assert FileIndex.get_index(conf) is not findex
@@ -0,0 +1,106 @@
+import os
+import re
+from types import SimpleNamespace
+
+import pytest
+
+from bd_scan_yocto.FileMatcherClass import FileMatcher
+from bd_scan_yocto.RecipeClass import Recipe
+from bd_scan_yocto.RecipeListClass import RecipeList
+
+recipes = [
+    ('zlib', '1.3.1'), ('openssl', '3.2.1'), ('libxml2', '2.12.5'), ('xml2', '2.12.5'), ('python3-six', '1.16.0'),
+    ('python3', '3.12.2'), ('glib-2.0', '2.78.4'), ('util-linux', '2.39.3'), ('util-linux-libuuid', '2.39.3'),
+    ('gcc-runtime', '13.2.0'), ('acl', '2.3.2'), ('libacl', '2.3.2'), ('bzip2', '1.0.8'), ('lz4', '1.9.4'),
+    ('busybox', '1.36.1'), ('base-files', '3.0.14'), ('ncurses', '6.4'), ('sqlite3', '3.45.1'), ('vim', '9.1'),
+]
+
+download_files = [
+    'zlib-1.3.1.tar.xz', 'zlib-1.3.1.tar.xz.done', 'zlib-1.3.1.tar.xz.lock', 'zlib_1.3.1.orig.tar.gz',
+    'zlib-v1.3.1.tar.gz', 'zlib-1.3.10.tar.gz', 'zlib-1.3.1', 'openssl-3.2.1.tar.gz', 'libxml2-2.12.5.tar.xz',
+    'python3-six-1.16.0.tar.gz', 'six-1.16.0.tar.gz', 'Python-3.12.2.tar.xz', 'glib-2.0-2.78.4.tar.xz',
+    'glib-2.78.4.tar.xz', 'util-linux-2.39.3.tar.xz', 'util-linux-2.39.3.tar.xz.done', 'acl-2.3.2.tar.gz',
+    'bzip2-1.0.8.tar.gz', 'lz4-1.9.4.tar.gz', 'busybox-1.36.1.tar.bz2', 'ncurses-6.4-20230424.tar.gz',
+    'sqlite-autoconf-3450100.tar.gz', 'vim-9.1.tar.gz', 'vim-9.1-r0.tar.gz', 'vim_9.1+git.tar.gz',
+]
+
+package_names = ['zlib', 'zlib-dev', 'libz1', 'openssl', 'libssl3', 'libxml2', 'libxml2-2', 'python3-six',
+                 'python3', 'python3-core', 'libpython3', 'glib-2.0', 'libglib-2.0-0', 'util-linux', 'libuuid1',
+                 'util-linux-libuuid', 'gcc-runtime', 'libgcc1', 'acl', 'libacl1', 'bzip2', 'libbz2-1', 'lz4',
+                 'liblz4-1', 'busybox', 'base-files', 'ncurses', 'ncurses-libncurses6', 'libncurses6', 'sqlite3',
+                 'libsqlite3-0', 'vim', 'vim-common']
+
+arch_suffixes = ['core2_64', 'cortexa57', 'x86_64', 'qemux86_64', 'all', 'noarch']
+
+
+def get_package_files(pkgtype):
+    files = []
+    for name, version in recipes:
+        for pkgname in package_names:
+            if not pkgname.startswith(name[:3]) and not pkgname.startswith('lib' + name[:3]):
+                continue
+            for arch in arch_suffixes:
+                if pkgtype == 'rpm':
+                    files.append(f"{pkgname}-{version}-r0.{arch}.rpm")
+                    files.append(f"{pkgname}-{version}+git0+abc-r1.{arch}.rpm")
+                else:
+                    files.append(f"{pkgname}_{version}-r0_{arch}.{pkgtype}")
+                    files.append(f"{pkgname}_v{version}-r0.1_{arch}.{pkgtype}")
+            files.append(f"{pkgname}-{version}.{pkgtype}.lock")
+            files.append(f"{pkgname}-{version}-r0.{pkgtype}.done")
+            files.append(f"{pkgname}-{version}")
+    return files
+
+
+def get_recipes():
+    return [Recipe(name, version) for name, version in recipes]
+
+
+def regex_find_files(recipe_list, pkgtype, all_pkg_files, all_download_files):
+    # Previous matcher - a download and a package regex per recipe applied to every file
+    found_files = []
+    for recipe in recipe_list:
+        found = False
+        recipe_esc = re.escape(recipe.name)
+        ver_esc = re.escape(recipe.version)
+        download_regex = re.compile(rf"^{recipe_esc}[_-]v?{ver_esc}[.-].*$")
+        pkg_regex = re.compile(rf"^(lib)?{recipe_esc}\d*[_-]v?{ver_esc}[+.-].*\.{pkgtype}")
+        for path in all_download_files:
+            if download_regex.match(os.path.basename(path)) is not None:
+                found_files.append(path)
+                found = True
+        if found:
+            continue
+        for path in all_pkg_files:
+            if pkg_regex.match(os.path.basename(path)) is not None:
+                found_files.append(path)
+    return found_files
+
+
+@pytest.mark.parametrize('pkgtype', ['rpm', 'ipk', 'deb'])
+def test_matcher_matches_regexes(pkgtype):
+    recipe_list = get_recipes()
+    matcher = FileMatcher(recipe_list, pkgtype)
+    for filename in download_files + get_package_files(pkgtype):
+        for recipe in recipe_list:
+            recipe_esc = re.escape(recipe.name)
+            ver_esc = re.escape(recipe.version)
+            download_match = re.match(rf"^{recipe_esc}[_-]v?{ver_esc}[.-].*$", filename) is not None
+            pkg_match = re.match(rf"^(lib)?{recipe_esc}\d*[_-]v?{ver_esc}[+.-].*\.{pkgtype}", filename) is not None
+            assert (recipe in matcher.match_download(filename)) == download_match, (filename, recipe.name)
+            assert (recipe in matcher.match_package(filename)) == pkg_match, (filename, recipe.name)
+
+
+@pytest.mark.parametrize('pkgtype', ['rpm', 'ipk', 'deb'])
+def test_find_files_matches_regexes(pkgtype):
+    pkg_dir = os.path.join('/build/tmp/deploy', pkgtype)
+    all_pkg_files = [os.path.join(pkg_dir, 'core2_64', name) for name in get_package_files(pkgtype)]
+    # Only some recipes have download files - others are located by package file
+    all_download_files = [os.path.join('/build/downloads', name) for name in download_files
+                          if not name.startswith(('openssl', 'acl', 'vim'))]
+    conf = SimpleNamespace(scan_all_packages=True, image_package_type=pkgtype)
+    reclist = RecipeList()
+    reclist.recipes = get_recipes()
+    expected = regex_find_files(reclist.recipes, pkgtype, all_pkg_files, all_download_files)
+    assert len(expected) > 0
+    assert reclist.find_files(conf, all_pkg_files, all_download_files) == expected
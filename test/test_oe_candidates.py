@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+
+import pytest
+
+from bd_scan_yocto.OEClass import OE
+from bd_scan_yocto.RecipeClass import Recipe
+
+distances = [[0, 0, 1], [0, 1, 0], [0, 2, 3], [1, 0, 0]]
+
+
+class LinearOE(OE):
+    # Previous near match search - every OE recipe with the recipe name compared in original order
+    def get_candidate_recipes(self, conf, recipe):
+        return [[self.recipe_store.get_recipe(row) for row in self.recipe_store.get_rows(recipe.name)]]
+
+
+def get_versions(oe, name):
+    # OE versions (including git/AUTOINC) plus versions near to them and versions not in the OE data
+    versions = set()
+    for row in oe.recipe_store.get_rows(name):
+        pv = oe.recipe_store.get_pv(row)
+        versions.update([pv, pv + '+git', pv + '-r1', pv + '.1', 'AUTOINC+' + pv])
+    versions.update(['', '9.9.9', '0.0.1', '1.0+gitAUTOINC+abcdef', 'AUTOINC+1.2', '3', 'v1.2'])
+    return sorted(versions)
+
+
+def match(oe, conf, name, version, epoch, layer):
+    recipe = Recipe(name, version)
+    recipe.epoch = epoch
+    recipe.layer = layer
+    result = oe.get_recipe(conf, recipe)
+    return result, recipe.matched_oe, recipe.matched_oe_exact, recipe.recipename_in_oe
+
+
+@pytest.mark.parametrize('distance', distances)
+def test_candidate_search_matches_linear_scan(load_oe, distance):
+    linear_oe = load_oe(LinearOE)
+    oe = load_oe()
+    conf = SimpleNamespace(max_oe_version_distance=distance)
+    count = 0
+    for name in list(oe.recipe_store.name_rows) + ['not-in-oe']:
+        for version in get_versions(oe, name):
+            for epoch in ['', '1', '2']:
+                for layer in ['meta', 'meta-oe', 'meta-custom']:
+                    assert match(oe, conf, name, version, epoch, layer) == \
+                        match(linear_oe, conf, name, version, epoch, layer), (name, version, epoch, layer)
+                    count += 1
+    assert count > 5000
+
+
+def test_candidates_are_subset_of_name_rows(load_oe):
+    oe = load_oe()
+    conf = SimpleNamespace(max_oe_version_distance=[0, 1, 0])
+    for name in oe.recipe_store.name_rows:
+        ids = [oe.recipe_store.ids[row] for row in oe.recipe_store.get_rows(name)]
+        for version in get_versions(oe, name):
+            candidates = oe.get_candidate_recipes(conf, Recipe(name, version))[0]
+            candidate_ids = [oe_recipe['id'] for oe_recipe in candidates]
+            # Candidates keep the original OE recipe order
+            assert candidate_ids == [oeid for oeid in ids if oeid in candidate_ids]
+
+
+@pytest.mark.parametrize('oe_branch', ['master', 'scarthgap', 'kirkstone', 'dunfell'])
+def test_preferred_branch_never_replaces_exact_match(load_oe, oe_branch):
+    # Near matches in the build's branch are only preferred when no recipe in any branch is an exact version match
+    conf_all = SimpleNamespace(max_oe_version_distance=[0, 1, 0], oe_branch='all')
+    conf_branch = SimpleNamespace(max_oe_version_distance=[0, 1, 0], oe_branch=oe_branch)
+    oe_all = load_oe(conf=conf_all)
+    oe = load_oe(conf=conf_branch)
+    assert oe.preferred_layerbranches
+    exact = 0
+    for name in oe.recipe_store.name_rows:
+        for version in get_versions(oe, name):
+            for epoch in ['', '1']:
+                expected = match(oe_all, conf_all, name, version, epoch, 'meta')
+                if expected[0][2]:
+                    exact += 1
+                    assert match(oe, conf_branch, name, version, epoch, 'meta') == expected, (name, version, epoch)
+    assert exact > 100
@@ -0,0 +1,114 @@
+import json
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from bd_scan_yocto.OEClass import OE
+
+branches = [{'id': 1, 'name': 'master'}, {'id': 2, 'name': 'scarthgap'}]
+new_branches = branches + [{'id': 3, 'name': 'walnascar'}]
+
+
+class FakeSession:
+    def __init__(self, status_code=200, content=None, headers=None, error=None):
+        self.status_code = status_code
+        self.content = json.dumps(content).encode('utf-8') if content is not None else b''
+        self.headers = headers or {}
+        self.error = error
+        self.requests = []
+
+    def get(self, url, headers=None, params=None):
+        self.requests.append((url, headers or {}))
+        if self.error is not None:
+            raise self.error
+        return SimpleNamespace(status_code=self.status_code, content=self.content, headers=self.headers)
+
+
+@pytest.fixture
+def conf(tmp_path):
+    return SimpleNamespace(oe_data_folder=str(tmp_path), oe_data_ttl=168)
+
+
+def write_cached(conf, age_hours, meta=True):
+    lfile = os.path.join(conf.oe_data_folder, 'oe_branches.json')
+    with open(lfile, "w") as outfile:
+        json.dump(branches, outfile)
+    fetched = time.time() - age_hours * 3600
+    if meta:
+        OE.save_oe_data_meta(lfile, {'fetched': fetched, 'etag': '"abc"', 'last_modified': 'Mon, 01 Jan 2026'})
+    else:
+        os.utime(lfile, (fetched, fetched))
+    return lfile
+
+
+def test_fresh_file_not_fetched(conf):
+    write_cached(conf, 1)
+    session = FakeSession(content=new_branches)
+    assert OE.get_oe_branches(conf, session) == branches
+    assert session.requests == []
+
+
+def test_ttl_zero_never_revalidates(conf):
+    conf.oe_data_ttl = 0
+    write_cached(conf, 10000)
+    session = FakeSession(content=new_branches)
+    assert OE.get_oe_branches(conf, session) == branches
+    assert session.requests == []
+
+
+def test_expired_file_not_modified(conf):
+    lfile = write_cached(conf, 200)
+    session = FakeSession(status_code=304)
+    assert OE.get_oe_branches(conf, session) == branches
+    url, headers = session.requests[0]
+    assert url.endswith('/branches/')
+    assert headers == {'If-None-Match': '"abc"', 'If-Modified-Since': 'Mon, 01 Jan 2026'}
+    # Revalidated - used without a request until the TTL expires again
+    assert time.time() - OE.load_oe_data_meta(lfile)['fetched'] < 60
+    session = FakeSession(status_code=304)
+    assert OE.get_oe_branches(conf, session) == branches
+    assert session.requests == []
+
+
+def test_expired_file_rewritten(conf):
+    lfile = write_cached(conf, 200)
+    session = FakeSession(content=new_branches, headers={'ETag': '"def"', 'Last-Modified': 'Tue, 02 Jan 2026'})
+    assert OE.get_oe_branches(conf, session) == new_branches
+    with open(lfile, "r") as infile:
+        assert json.load(infile) == new_branches
+    meta = OE.load_oe_data_meta(lfile)
+    assert (meta['etag'], meta['last_modified']) == ('"def"', 'Tue, 02 Jan 2026')
+    assert not os.path.exists(lfile + '.tmp')
+
+
+def test_file_without_meta_aged_by_mtime(conf):
+    write_cached(conf, 200, meta=False)
+    session = FakeSession(status_code=304)
+    assert OE.get_oe_branches(conf, session) == branches
+    assert session.requests[0][1] == {}
+
+
+@pytest.mark.parametrize('session', [FakeSession(error=requests.exceptions.ConnectionError('no network')),
+                                     FakeSession(status_code=503)])
+def test_server_unavailable_uses_stale_file(conf, session):
+    lfile = write_cached(conf, 200)
+    mtime = os.path.getmtime(lfile)
+    assert OE.get_oe_branches(conf, session) == branches
+    assert os.path.getmtime(lfile) == mtime
+    # Still stale - revalidated again on the next run
+    assert time.time() - OE.load_oe_data_meta(lfile)['fetched'] > 199 * 3600
+
+
+def test_no_file_fetched_and_written(conf):
+    session = FakeSession(content=branches, headers={'ETag': '"abc"'})
+    assert OE.get_oe_branches(conf, session) == branches
+    assert session.requests[0][1] == {}
+    assert os.path.isfile(os.path.join(conf.oe_data_folder, 'oe_branches.json'))
+
+
+def test_no_file_server_unavailable(conf):
+    session = FakeSession(error=requests.exceptions.ConnectionError('no network'))
+    assert OE.get_oe_branches(conf, session) == {}
@@ -0,0 +1,111 @@
+import logging
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from bd_scan_yocto.OEMatchCacheClass import OEMatchCache
+from bd_scan_yocto.RecipeClass import Recipe
+from bd_scan_yocto.RecipeListClass import RecipeList
+
+
+@pytest.fixture
+def conf(tmp_path):
+    oe_data_folder = tmp_path / 'oe'
+    oe_data_folder.mkdir()
+    for filename in ['oe_layers.json', 'oe_recipes.json', 'oe_layerbranches.json', 'oe_branches.json']:
+        (oe_data_folder / filename).write_text('[]')
+    cache_dir = tmp_path / 'cache'
+    cache_dir.mkdir()
+    return SimpleNamespace(max_oe_version_distance=[0, 1, 0], oe_data_folder=str(oe_data_folder),
+                           cache_dir=str(cache_dir), oe_match_workers=1, oe_branch='all', layerseries_corenames='',
+                           distro_codename='')
+
+
+def make_reclist(oe):
+    reclist = RecipeList()
+    for name in sorted(oe.recipe_store.name_rows):
+        pv = oe.recipe_store.get_pv(oe.recipe_store.get_rows(name)[0])
+        for version, layer in [(pv, 'meta'), (pv + '.1', 'meta-oe'), ('999.0', 'meta')]:
+            recipe = Recipe(name, version)
+            recipe.layer = layer
+            reclist.recipes.append(recipe)
+    reclist.recipes.append(Recipe('not-in-oe', '1.0'))
+    return reclist
+
+
+def run_match(caplog, conf, oe):
+    reclist = make_reclist(oe)
+    caplog.clear()
+    with caplog.at_level(logging.INFO):
+        reclist.check_recipes_in_oe(conf, oe)
+    summary = caplog.messages[caplog.messages.index("SUMMARY OE MATCH DATA:"):]
+    recipes = [(recipe.oe_recipe, recipe.oe_layer, recipe.matched_oe, recipe.matched_oe_exact,
+                recipe.recipename_in_oe) for recipe in reclist.recipes]
+    return summary, recipes
+
+
+def test_hit_same_as_cold_match(load_oe, caplog, conf):
+    cold = run_match(caplog, conf, load_oe(conf=conf))
+    assert os.path.isfile(os.path.join(conf.cache_dir, 'oe_match_cache.json'))
+
+    oe = load_oe(conf=conf)
+
+    def get_recipe(conf_, recipe):
+        raise AssertionError(f"{recipe.name}/{recipe.version} not matched from cache")
+    oe.get_recipe = get_recipe
+    warm = run_match(caplog, conf, oe)
+    assert any(f"{len(cold[1])} recipe OE matches from cache" in message for message in caplog.messages)
+    assert warm == cold
+    assert len([recipe for recipe in cold[1] if recipe[0] != {}]) > 0
+
+
+@pytest.mark.parametrize('change', ['mtime', 'size'])
+def test_oe_data_file_change_clears_cache(load_oe, caplog, conf, change):
+    oe = load_oe(conf=conf)
+    run_match(caplog, conf, oe)
+    lfile = os.path.join(conf.oe_data_folder, 'oe_recipes.json')
+    st = os.stat(lfile)
+    if change == 'size':
+        with open(lfile, "a") as outfile:
+            outfile.write(' ')
+        os.utime(lfile, ns=(st.st_atime_ns, st.st_mtime_ns))
+    else:
+        os.utime(lfile, ns=(st.st_atime_ns, st.st_mtime_ns + 1000000))
+    match_cache = OEMatchCache(conf, oe)
+    assert match_cache.matches == {}
+    assert match_cache.changed
+    assert all(match_cache.get_result(recipe) is None for recipe in make_reclist(oe).recipes)
+
+
+def test_layer_change_misses(load_oe, caplog, conf):
+    oe = load_oe(conf=conf)
+    run_match(caplog, conf, oe)
+    recipe = Recipe('busybox', oe.recipe_store.get_pv(oe.recipe_store.get_rows('busybox')[0]))
+    assert OEMatchCache(conf, oe).get_result(recipe) is not None
+
+    # Layerbranch of the matched OE recipe now in a different layer
+    layerbranch = oe.recipe_store.get_layerbranch(oe.recipe_store.get_rows('busybox')[0])
+    layer_ids = list(oe.layerid_dict)
+    current = oe.layerbranchid_dict[layerbranch]['layer']
+    oe.layerbranchid_dict[layerbranch]['layer'] = layer_ids[(layer_ids.index(current) + 1) % len(layer_ids)]
+    match_cache = OEMatchCache(conf, oe)
+    assert match_cache.get_result(recipe) is None
+    assert match_cache.hits == 0
+
+
+def test_preferred_branches_in_key(load_oe, caplog, conf):
+    oe = load_oe(conf=conf)
+    run_match(caplog, conf, oe)
+    recipes = make_reclist(oe).recipes
+    assert all(OEMatchCache(conf, oe).get_result(recipe) is not None for recipe in recipes)
+
+    conf.oe_branch = 'scarthgap'
+    oe_branch = load_oe(conf=conf)
+    assert oe_branch.preferred_branches
+    match_cache = OEMatchCache(conf, oe_branch)
+    assert all(match_cache.get_result(recipe) is None for recipe in recipes)
+    run_match(caplog, conf, oe_branch)
+    assert all(OEMatchCache(conf, oe_branch).get_result(recipe) is not None for recipe in recipes)
+    # Results for searching all branches are kept
+    assert all(OEMatchCache(conf, oe).get_result(recipe) is not None for recipe in recipes)
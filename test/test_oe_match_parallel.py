@@ -0,0 +1,51 @@
+import logging
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from bd_scan_yocto.RecipeClass import Recipe
+from bd_scan_yocto.RecipeListClass import RecipeList
+
+
+def make_reclist(oe):
+    # Several recipes per OE recipe name (exact, close and unmatched versions in different layers) plus recipes
+    # not in the OE data
+    reclist = RecipeList()
+    for name in sorted(oe.recipe_store.name_rows):
+        pvs = sorted({oe.recipe_store.get_pv(row) for row in oe.recipe_store.get_rows(name)})
+        for pv in pvs[:3]:
+            for version, layer in [(pv, 'meta'), (pv + '.1', 'meta-oe'), (pv + '+git', 'meta-custom')]:
+                recipe = Recipe(name, version)
+                recipe.layer = layer
+                reclist.recipes.append(recipe)
+    for name in ['not-in-oe', 'custom-app']:
+        reclist.recipes.append(Recipe(name, '1.0'))
+    return reclist
+
+
+def run_match(load_oe, caplog, conf):
+    oe = load_oe(conf=conf)
+    reclist = make_reclist(oe)
+    caplog.clear()
+    with caplog.at_level(logging.INFO):
+        reclist.check_recipes_in_oe(conf, oe)
+    summary = caplog.messages[caplog.messages.index("SUMMARY OE MATCH DATA:"):]
+    recipes = [(recipe.name, recipe.version, recipe.layer, recipe.oe_layer.get('name'),
+                recipe.oe_recipe.get('id'), recipe.oe_recipe.get('pv'), recipe.matched_oe,
+                recipe.matched_oe_exact, recipe.recipename_in_oe) for recipe in reclist.recipes]
+    return summary, recipes
+
+
+@pytest.mark.parametrize('oe_branch', ['all', 'scarthgap'])
+def test_parallel_match_same_as_serial(load_oe, caplog, monkeypatch, oe_branch):
+    # Ensure worker processes are used on hosts with a single CPU
+    monkeypatch.setattr(os, 'cpu_count', lambda: 4)
+    values = dict(max_oe_version_distance=[0, 1, 0], oe_data_folder='', cache_dir='', oe_branch=oe_branch,
+                  layerseries_corenames='', distro_codename='')
+    serial = run_match(load_oe, caplog, SimpleNamespace(oe_match_workers=1, **values))
+    parallel = run_match(load_oe, caplog, SimpleNamespace(oe_match_workers=4, **values))
+    assert any('using 4 worker processes' in message for message in caplog.messages)
+    assert not any('serially' in message for message in caplog.messages)
+    assert len([recipe for recipe in serial[1] if recipe[4] is not None]) > 0
+    assert parallel == serial
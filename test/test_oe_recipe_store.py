@@ -0,0 +1,133 @@
+import json
+import mmap
+import os
+
+import pytest
+
+from bd_scan_yocto import OERecipeStoreClass
+from bd_scan_yocto.OERecipeStoreClass import OERecipeStore, oe_store_header
+
+data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+
+class TrackedMmap(mmap.mmap):
+    opened = []
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        TrackedMmap.opened.append(self)
+
+
+@pytest.fixture
+def tracked_mmap(monkeypatch):
+    TrackedMmap.opened = []
+    monkeypatch.setattr(OERecipeStoreClass.mmap, 'mmap', TrackedMmap)
+    return TrackedMmap.opened
+
+
+def load_recipes():
+    with open(os.path.join(data_dir, 'oe_data.json'), "r") as infile:
+        recipes = json.load(infile)['recipes']
+    # Recipe fields which may be missing or None in layerindex data
+    recipes.append({'id': None, 'pn': 'no-version', 'pv': None, 'pr': None, 'pe': None, 'layerbranch': None})
+    recipes.append({'id': 999999, 'pn': 'unicode-é', 'pv': '1.0', 'pr': 'r0', 'pe': '', 'layerbranch': 1})
+    return recipes
+
+
+def make_store():
+    store = OERecipeStore()
+    for recipe in load_recipes():
+        store.add_recipe(recipe)
+    return store
+
+
+def get_contents(store):
+    return {pn: [store.get_recipe(row) for row in store.get_rows(pn)] for pn in store.name_rows}
+
+
+@pytest.fixture
+def saved_store(tmp_path):
+    source = tmp_path / 'oe_recipes.json'
+    source.write_text(json.dumps(load_recipes()))
+    bfile = str(tmp_path / 'oe_recipes.bin')
+    store = make_store()
+    assert store.save_binary(bfile, str(source))
+    return store, bfile, str(source)
+
+
+def test_round_trip(saved_store):
+    store, bfile, source = saved_store
+    loaded = OERecipeStore.load_binary(bfile, source)
+    assert loaded is not None and loaded.mm is not None
+    assert loaded.count() == store.count()
+    assert loaded.count_strings() == store.count_strings()
+    assert get_contents(loaded) == get_contents(store)
+    for pn in store.name_rows:
+        for row in store.get_rows(pn):
+            oeid = store.ids[row]
+            if oeid >= 0:
+                assert loaded.get_recipe(loaded.find_row(pn, oeid)) == store.get_recipe(row)
+    assert not loaded.has_name('not-in-oe')
+
+
+def test_stale_source(saved_store, tracked_mmap):
+    store, bfile, source = saved_store
+    st = os.stat(source)
+    os.utime(source, ns=(st.st_atime_ns, st.st_mtime_ns + 1000000))
+    assert OERecipeStore.load_binary(bfile, source) is None
+    os.utime(source, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert OERecipeStore.load_binary(bfile, source) is not None
+
+    with open(source, "a") as outfile:
+        outfile.write(' ')
+    os.utime(source, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert OERecipeStore.load_binary(bfile, source) is None
+    assert tracked_mmap[0].closed and not tracked_mmap[1].closed and tracked_mmap[2].closed
+
+
+def test_missing_file(tmp_path):
+    assert OERecipeStore.load_binary(str(tmp_path / 'missing.bin')) is None
+
+
+@pytest.mark.parametrize('length', [0, 10, oe_store_header.size, oe_store_header.size + 12, -1, -9])
+def test_truncated_file_rejected(saved_store, tracked_mmap, length):
+    store, bfile, source = saved_store
+    with open(bfile, "rb") as infile:
+        data = infile.read()
+    with open(bfile, "wb") as outfile:
+        outfile.write(data[:length])
+    assert OERecipeStore.load_binary(bfile) is None
+    assert all(mm.closed for mm in tracked_mmap)
+
+
+def test_extended_file_rejected(saved_store, tracked_mmap):
+    store, bfile, source = saved_store
+    with open(bfile, "ab") as outfile:
+        outfile.write(b'\0' * 8)
+    assert OERecipeStore.load_binary(bfile) is None
+    assert all(mm.closed for mm in tracked_mmap)
+
+
+def test_wrong_magic_rejected(saved_store, tracked_mmap):
+    store, bfile, source = saved_store
+    with open(bfile, "r+b") as outfile:
+        outfile.write(b'BDOESTR0')
+    assert OERecipeStore.load_binary(bfile) is None
+    assert len(tracked_mmap) == 1 and tracked_mmap[0].closed
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_garbage_rejected(saved_store, tracked_mmap, seed):
+    store, bfile, source = saved_store
+    size = os.path.getsize(bfile)
+    data = bytes((index * 131 + seed * 17) % 251 for index in range(size))
+    with open(bfile, "wb") as outfile:
+        outfile.write(data)
+    assert OERecipeStore.load_binary(bfile) is None
+    # Garbage after a valid header (sizes match the file but offsets and name ranges do not)
+    store.save_binary(bfile)
+    with open(bfile, "r+b") as outfile:
+        outfile.seek(oe_store_header.size)
+        outfile.write(data[oe_store_header.size:])
+    assert OERecipeStore.load_binary(bfile) is None
+    assert all(mm.closed for mm in tracked_mmap)
@@ -0,0 +1,129 @@
+import json
+import os
+import re
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from bd_scan_yocto.OEClass import OE
+
+data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+
+class FakeLayerindex:
+    # Recipes endpoint of the layerindex API - applies the pn__regex filter unless ignore_filter is set
+    # (status_code returned for filtered requests)
+    def __init__(self, ignore_filter=False, status_code=200):
+        with open(os.path.join(data_dir, 'oe_data.json'), "r") as infile:
+            self.recipes = json.load(infile)['recipes']
+        self.ignore_filter = ignore_filter
+        self.status_code = status_code
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def get(self, url, headers=None, params=None):
+        assert url.endswith('/recipes/')
+        with self.lock:
+            self.requests.append(params)
+        recipes = self.recipes
+        status_code = 200
+        if params is not None:
+            status_code = self.status_code
+            if not self.ignore_filter:
+                name_regex = params['filter'].split('pn__regex:', 1)[1]
+                recipes = [recipe for recipe in recipes if re.match(name_regex, recipe['pn'])]
+        return SimpleNamespace(status_code=status_code, content=json.dumps(recipes).encode('utf-8'),
+                               headers={})
+
+    @staticmethod
+    def get_names(params):
+        # Requested recipe names (unescaped)
+        names = params['filter'].split('pn__regex:^(', 1)[1][:-2]
+        return [re.sub(r'\\(.)', r'\1', name) for name in names.split('|')]
+
+
+@pytest.fixture
+def conf(tmp_path, monkeypatch):
+    monkeypatch.setattr(OE, 'oe_scoped_batch_size', 3)
+    monkeypatch.setattr(OE, 'oe_scoped_filter_ignored', False)
+    return SimpleNamespace(oe_data_folder=str(tmp_path), oe_data_ttl=168)
+
+
+def get_names(server):
+    return sorted({recipe['pn'] for recipe in server.recipes})
+
+
+def expected_recipes(server, names):
+    return sorted((recipe for recipe in server.recipes if recipe['pn'] in names), key=lambda recipe: recipe['id'])
+
+
+def by_id(recipes):
+    return sorted(recipes, key=lambda recipe: recipe['id'])
+
+
+def test_batches(conf):
+    server = FakeLayerindex()
+    names = get_names(server) + ['not-in-oe', 'also.not+in-oe']
+    recipes = OE.get_oe_recipes_scoped(conf, names, server)
+    assert by_id(recipes) == expected_recipes(server, names)
+    assert len(server.requests) == 4
+    requested = [name for params in server.requests for name in server.get_names(params)]
+    assert sorted(requested) == sorted(names)
+    assert all(len(server.get_names(params)) <= 3 for params in server.requests)
+
+
+def test_cached_names_not_fetched(conf):
+    server = FakeLayerindex()
+    names = get_names(server)
+    OE.get_oe_recipes_scoped(conf, names[:4] + ['not-in-oe'], server)
+    assert os.path.isfile(os.path.join(conf.oe_data_folder, 'oe_recipes_scoped.json'))
+
+    server = FakeLayerindex()
+    recipes = OE.get_oe_recipes_scoped(conf, names + ['not-in-oe'], server)
+    assert by_id(recipes) == expected_recipes(server, names)
+    # Only names not in the cache are fetched (names without OE recipes are also cached)
+    requested = [name for params in server.requests for name in server.get_names(params)]
+    assert sorted(requested) == sorted(names[4:])
+
+
+@pytest.mark.parametrize('ttl, refetched', [(168, True), (0, False)])
+def test_expired_names_refetched(conf, ttl, refetched):
+    server = FakeLayerindex()
+    names = get_names(server)
+    OE.get_oe_recipes_scoped(conf, names, server)
+    cfile = os.path.join(conf.oe_data_folder, 'oe_recipes_scoped.json')
+    with open(cfile, "r") as infile:
+        cache = json.load(infile)
+    cache['fetched'][names[0]] -= 169 * 3600
+    with open(cfile, "w") as outfile:
+        json.dump(cache, outfile)
+
+    conf.oe_data_ttl = ttl
+    server = FakeLayerindex()
+    recipes = OE.get_oe_recipes_scoped(conf, names, server)
+    assert by_id(recipes) == expected_recipes(server, names)
+    if refetched:
+        assert [server.get_names(params) for params in server.requests] == [[names[0]]]
+    else:
+        assert server.requests == []
+
+
+def test_filter_ignored_gets_all_recipes(conf):
+    server = FakeLayerindex(ignore_filter=True)
+    recipes = OE.get_oe_recipes_scoped(conf, get_names(server)[:7], server)
+    assert by_id(recipes) == by_id(server.recipes)
+    # Only the first batch is requested before falling back to an unfiltered request
+    assert len(server.requests) == 2
+    assert server.requests[0] is not None and server.requests[1] is None
+    assert OE.oe_scoped_filter_ignored
+    # Partial results are not cached
+    assert not os.path.exists(os.path.join(conf.oe_data_folder, 'oe_recipes_scoped.json'))
+
+
+def test_failed_batch_gets_all_recipes(conf):
+    server = FakeLayerindex(status_code=500)
+    recipes = OE.get_oe_recipes_scoped(conf, get_names(server), server)
+    assert by_id(recipes) == by_id(server.recipes)
+    assert server.requests[-1] is None
+    assert os.path.isfile(os.path.join(conf.oe_data_folder, 'oe_recipes.json'))
@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+from bd_scan_yocto.ScanCacheClass import ScanCache
+
+
+def make_conf(cache_dir, **kwargs):
+    values = dict(cache_dir=str(cache_dir), bd_url='https://bd.example.com', bd_project='proj', bd_version='ver',
+                  detect_opts='', sig_scan_shards=1, unmap=False)
+    values.update(kwargs)
+    return SimpleNamespace(**values)
+
+
+def make_files(tmp_path):
+    files = []
+    for name in ['a.tar.gz', 'b.rpm']:
+        path = tmp_path / name
+        path.write_text(name)
+        files.append(str(path))
+    return files
+
+
+def test_unchanged_files_skipped(tmp_path):
+    files = make_files(tmp_path)
+    ScanCache(make_conf(tmp_path)).mark_scanned(files)
+    assert ScanCache(make_conf(tmp_path)).is_unchanged(files)
+    (tmp_path / 'b.rpm').write_text('changed')
+    assert not ScanCache(make_conf(tmp_path)).is_unchanged(files)
+
+
+def test_server_and_options_force_rescan(tmp_path):
+    files = make_files(tmp_path)
+    ScanCache(make_conf(tmp_path)).mark_scanned(files)
+    assert not ScanCache(make_conf(tmp_path, bd_url='https://other.example.com')).is_unchanged(files)
+    assert not ScanCache(make_conf(tmp_path, detect_opts='--detect.timeout=100')).is_unchanged(files)
+    assert not ScanCache(make_conf(tmp_path, sig_scan_shards=4)).is_unchanged(files)
+    assert ScanCache(make_conf(tmp_path, bd_url='https://bd.example.com/')).is_unchanged(files)
+
+
+def test_clear_forces_rescan(tmp_path):
+    files = make_files(tmp_path)
+    ScanCache(make_conf(tmp_path)).mark_scanned(files)
+    ScanCache(make_conf(tmp_path)).clear("project version does not exist")
+    assert not ScanCache(make_conf(tmp_path)).is_unchanged(files)
+
+    ScanCache(make_conf(tmp_path)).mark_scanned(files)
+    ScanCache(make_conf(tmp_path, unmap=True))
+    assert not ScanCache(make_conf(tmp_path)).is_unchanged(files)
@@ -0,0 +1,48 @@
+import os
+
+from bd_scan_yocto import BBClass
+from bd_scan_yocto.BBClass import BB
+
+data_dir = os.path.join(os.path.dirname(__file__), 'data')
+task_depends_file = os.path.join(data_dir, 'task-depends.dot')
+
+
+def read_task_depends_dot_lines(task_depends_file):
+    # Previous parser - readlines() and string splits
+    recipe_dict = {}
+    with open(task_depends_file, "r") as tdfile:
+        for line in tdfile.readlines():
+            line = line.strip()
+            if not line.startswith("\""):
+                continue
+            arr = line.split('"')
+            recipe = arr[1].split('.')[0]
+            if line.endswith("]"):
+                verstring = arr[3].split("\\n")[1]
+                if recipe not in recipe_dict:
+                    recipe_dict[recipe] = {
+                        'ver': verstring.split('-')[0][1:],
+                        'rel': verstring.split('-')[1],
+                        'children': [],
+                        'processed': False
+                    }
+            else:
+                subrec = arr[3].split('.')[0]
+                if subrec != recipe and recipe in recipe_dict and subrec not in recipe_dict[recipe]['children']:
+                    recipe_dict[recipe]['children'].append(subrec)
+    return recipe_dict
+
+
+def test_parser_matches_previous_parser():
+    expected = read_task_depends_dot_lines(task_depends_file)
+    assert len(expected) > 0
+    assert BB.read_task_depends_dot(task_depends_file) == expected
+
+
+def test_parallel_chunks_match_previous_parser(monkeypatch):
+    # Force small chunks and a split across worker processes
+    monkeypatch.setattr(BBClass, 'task_depends_chunk_size', 64 * 1024)
+    monkeypatch.setattr(BBClass, 'task_depends_parallel_size', 0)
+    monkeypatch.setattr(BBClass.os, 'cpu_count', lambda: 4)
+    assert len(BB.get_task_depends_ranges(task_depends_file, os.path.getsize(task_depends_file))) == 4
+    assert BB.read_task_depends_dot(task_depends_file) == read_task_depends_dot_lines(task_depends_file)